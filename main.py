@@ -1,15 +1,31 @@
+import time
+import asyncio
+import hashlib
 import logging
+import functools
+import threading
 import morecantile
+import numpy as np
 from pathlib import Path
-from fastapi import FastAPI, Response, Query, HTTPException
+from pydantic import BaseModel
+from fastapi import FastAPI, Request, Response, Query, HTTPException, Header
+from fastapi.responses import PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
-from rio_tiler.profiles import img_profiles
 
+from src import settings
 from src.general import GeneralManager, ManagerType
-from src.base import ParametersCOG
-from src.tools import retrieve_transparent_image
-
-GLOBAL_DATA_PATH = Path("./data")
+from src.base import ParametersCOG, TileStats, reader_cache
+from src.render import TileRenderer
+from src.tile_cache import TileCache
+from src.executor import RenderExecutor, RenderQueueFull
+from src.singleflight import SingleFlight
+from src.metrics import TileMetrics
+from src.encoding import MEDIA_TYPES, negotiate_format
+from src.reload import DataReloader
+from src.catalog import Catalog, CatalogEntry
+from src.encode_pool import EncodePool
+
+GLOBAL_DATA_PATH = Path(settings.DATA_PATH)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,93 +38,285 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allows all origins (for development - be more specific in production)
     allow_credentials=False,
-    allow_methods=["GET", "OPTIONS"],
+    allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
 )
 
 # Setup bathy
 general_manager = GeneralManager(GLOBAL_DATA_PATH)
+tile_cache = TileCache(Path(settings.CACHE_PATH), settings.TILE_CACHE_MEMORY_MB, settings.TILE_CACHE_DISK == 1, settings.TILE_CACHE_DISK_MB)
 
+# PNG encoding holds the GIL, a pool of processes lets one worker encode on every core.
+encode_pool = EncodePool(settings.ENCODE_PROCESSES) if settings.ENCODE_PROCESSES > 0 else None
+tile_renderer = TileRenderer(general_manager, GLOBAL_DATA_PATH, tile_cache, encode_pool, settings.METATILE_SIZE)
 
-@app.get("/{collection_name}/{year}/{z}/{x}/{y}.png")
-async def serve_collection_tile(collection_name: str, year: str, z: int, x: int, y: int, asv: bool = True) -> Response:
-    """Serve tiles from a predefined COG collection"""
+# Blocking work (GDAL reads, merging, PNG encoding) runs here to keep the event loop free.
+render_executor = RenderExecutor(settings.RENDER_THREADS, settings.MAX_INFLIGHT_RENDERS, settings.RENDER_QUEUE_TIMEOUT)
 
-    try:
-        # Get bounding box from x, y, z
-        tms = morecantile.tms.get("WebMercatorQuad")  # default TiTiler TMS
-        bb = tms.bounds(x, y, z)
-        params = ParametersCOG(x, y, z, bb, with_asv=asv)
 
+# Identical tiles requested at the same time are rendered once.
+tile_flights = SingleFlight()
 
-        tile = general_manager.get_tile(collection_name, year, params)
+tile_metrics = TileMetrics()
 
-        if tile == None:
-            png_data = retrieve_transparent_image(Path(GLOBAL_DATA_PATH, "transparent.png")).getvalue()
-        else:
-            png_data = tile.render(img_format="PNG", add_mask=False, **img_profiles.get("png"))
-        
-        return Response(
-            png_data,
-            media_type="image/png",
-            headers={
-                "Cache-Control": "public, max-age=3600",  # Cache for 1 hour
-                "Access-Control-Allow-Origin": "*"  # Allow CORS
-            }
-        ) 
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Internal server error")
+# Layer list, filters and legends, rebuilt after a reload.
+catalog = Catalog(general_manager)
 
-@app.get("/{collection_name}/{year}/{specie}/{z}/{x}/{y}.png")
-async def serve_collection_tile(collection_name: str, year: str, specie: str, z: int, x: int, y: int) -> Response:
-    """Serve tiles from a predefined COG collection"""
+# Rebuild the indexes of the years changed on disk, in every worker.
+data_reloader = DataReloader(general_manager, tile_cache, Path(settings.CACHE_PATH, "reload.stamp"), settings.RELOAD_INTERVAL)
 
-    try:
-        # Get bounding box from x, y, z
-        tms = morecantile.tms.get("WebMercatorQuad")  # default TiTiler TMS
-        bb = tms.bounds(x, y, z)
-        params = ParametersCOG(x, y, z, bb, with_asv=False)
+
+@app.on_event("startup")
+def start_data_reloader() -> None:
+    data_reloader.start()
+
+
+@app.on_event("startup")
+def start_warm_up() -> None:
+    # Years are indexed on first access, warming up only moves that work before the first requests.
+    if settings.WARMUP == 1:
+        threading.Thread(target=general_manager.warm_up, name="warm-up", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def shutdown_render_executor() -> None:
+    data_reloader.stop()
+    render_executor.shutdown()
+    if encode_pool != None:
+        encode_pool.shutdown()
+
+
+def raise_busy() -> None:
+    raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
+
+
+@functools.lru_cache()
+def get_empty_tile_etag(img_format: str, tilesize: int) -> str:
+    return f'"{hashlib.blake2b(tile_renderer.get_empty_tile(img_format, tilesize), digest_size=8).hexdigest()}"'
+
+
+def get_tile_headers(collection_name: str, year: str, specie: str | None, etag: str | None, vary_accept: bool) -> dict[str, str]:
+    max_age = settings.ARCHIVED_TILE_MAX_AGE if general_manager.is_archived(collection_name, year, specie) else settings.TILE_MAX_AGE
+    headers = {
+        "Cache-Control": f"public, max-age={max_age}",
+        "Access-Control-Allow-Origin": "*",  # Allow CORS
+    }
+    if etag != None:
+        headers["ETag"] = etag
+    if vary_accept:
+        headers["Vary"] = "Accept"
+    return headers
+
+
+def is_not_modified(request: Request, etag: str | None) -> bool:
+    return etag != None and etag in request.headers.get("if-none-match", "")
+
+
+def empty_tile_response(request: Request, collection_name: str, year: str, specie: str | None, img_format: str, tilesize: int, vary_accept: bool) -> Response:
+    """ Constant answer for tiles without data, with an ETag that never changes. """
+    headers = get_tile_headers(collection_name, year, specie, get_empty_tile_etag(img_format, tilesize), vary_accept)
+
+    if is_not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if settings.EMPTY_TILE_STATUS == 204:
+        return Response(status_code=204, headers=headers)
+    return Response(tile_renderer.get_empty_tile(img_format, tilesize), media_type=MEDIA_TYPES[img_format], headers=headers)
 
 
-        tile = general_manager.get_tile_with_species(collection_name, year, specie, params)
+async def serve_tile(request: Request, collection_name: str, year: str, specie: str | None, params: ParametersCOG, vary_accept: bool = False) -> Response:
+    """ Render a tile off the event loop, sharing the work with identical requests in flight. """
 
-        if tile == None:
-            png_data = retrieve_transparent_image(Path(GLOBAL_DATA_PATH, "transparent.png")).getvalue()
+    start = time.perf_counter()
+
+    # Outside the extent of the layer or far above its resolution: nothing to read.
+    if general_manager.is_outside(collection_name, year, specie, params):
+        params.stats.cache = "outside"
+        tile_metrics.observe_tile(collection_name, params.z, params.stats, (time.perf_counter() - start) * 1000)
+        return empty_tile_response(request, collection_name, year, specie, params.img_format, params.tilesize, vary_accept)
+
+    # Revalidation: the ETag only needs the index, answer before any read when the year is indexed.
+    if "if-none-match" in request.headers and general_manager.is_loaded(collection_name, year, specie):
+        etag = tile_renderer.get_etag(collection_name, year, specie, params)
+        if is_not_modified(request, etag):
+            params.stats.cache = "not_modified"
+            tile_metrics.observe_tile(collection_name, params.z, params.stats, (time.perf_counter() - start) * 1000)
+            return Response(status_code=304, headers=get_tile_headers(collection_name, year, specie, etag, vary_accept))
+
+    try:
+        async def render_tile() -> tuple[bytes, TileStats, str | None]:
+            if specie == None:
+                tile_data = await render_executor.run(tile_renderer.render_tile, collection_name, year, params)
+            else:
+                tile_data = await render_executor.run(tile_renderer.render_specie_tile, collection_name, year, specie, params)
+            return tile_data, params.stats, params.etag
+
+        flight_key = (collection_name, year, specie, params.z, params.x, params.y, params.with_asv, params.style_key(), params.img_format)
+        tile_data, stats, etag = await tile_flights.run(flight_key, render_tile)
+        duration_ms = (time.perf_counter() - start) * 1000
+        if stats is params.stats:
+            tile_metrics.observe_tile(collection_name, params.z, stats, duration_ms)
         else:
-            png_data = tile.render(img_format="PNG", add_mask=False, **img_profiles.get("png"))
-        
-        return Response(
-            png_data,
-            media_type="image/png",
-            headers={
-                "Cache-Control": "public, max-age=3600",  # Cache for 1 hour
-                "Access-Control-Allow-Origin": "*"  # Allow CORS
-            }
-        ) 
-        
+            # Coalesced with an identical request, which rendered the tile and counted its reads.
+            tile_metrics.observe_coalesced(collection_name, params.z, duration_ms)
+
+        if tile_data == tile_renderer.get_empty_tile(params.img_format, params.tilesize):
+            return empty_tile_response(request, collection_name, year, specie, params.img_format, params.tilesize, vary_accept)
+
+        headers = get_tile_headers(collection_name, year, specie, etag, vary_accept)
+        headers["X-Tile-Sources"] = stats.to_header()
+        headers["Server-Timing"] = f"{stats.to_server_timing()}, total;dur={duration_ms:.2f}".lstrip(", ")
+
+        if is_not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(tile_data, media_type=MEDIA_TYPES[params.img_format], headers=headers)
+
+    except RenderQueueFull:
+        raise_busy()
     except Exception as e:
+        logger.exception(f"Failed to serve tile {collection_name}/{year}/{specie or ''}/{params.z}/{params.x}/{params.y}")
+        tile_metrics.observe_error(collection_name, params.z)
         raise HTTPException(status_code=500, detail="Internal server error")
 
+
+def get_tile_format(collection_name: str, ext: str, request: Request) -> tuple[str, bool]:
+    """ Return the format to encode the tile with and whether it depends on the Accept header. """
+    if ext not in MEDIA_TYPES and ext != "jpeg":
+        raise HTTPException(status_code=404, detail=f"Unknown tile format {ext}")
+
+    prefer_lossy = settings.NEGOTIATE_FORMAT == 1 and ManagerType.prefer_lossy(collection_name)
+    img_format = negotiate_format(ext, request.headers.get("accept"), prefer_lossy)
+
+    return img_format, prefer_lossy and ext == "png"
+
+
+def build_tilejson(request: Request, collection_name: str, year: str, specie: str | None) -> dict:
+    """ TileJSON 3.0 of a layer, bounds and zoom range come from the index. """
+    year_manager = general_manager.get_year_manager(collection_name, year, specie)
+    if year_manager == None:
+        raise HTTPException(status_code=404, detail="Layer not found")
+
+    coverage = year_manager.coverage
+    path = f"{collection_name}/{year}" if specie == None else f"{collection_name}/{year}/{specie}"
+    query = f"?{request.url.query}" if request.url.query else ""
+    name = f"{ManagerType.get_displayable_name(collection_name)} {year}" if specie == None else f"{ManagerType.get_displayable_name(collection_name)} {year} {specie}"
+
+    return {
+        "tilejson": "3.0.0",
+        "name": name,
+        "description": ManagerType.get_description(collection_name),
+        "attribution": ManagerType.get_attribution(collection_name),
+        "scheme": "xyz",
+        "tiles": [f"{str(request.base_url).rstrip('/')}/{path}" + "/{z}/{x}/{y}.png" + query],
+        "bounds": list(coverage.bounds),
+        "center": [(coverage.bounds[0] + coverage.bounds[2]) / 2, (coverage.bounds[1] + coverage.bounds[3]) / 2, coverage.maxzoom],
+        "minzoom": coverage.minzoom,
+        "maxzoom": coverage.maxzoom,
+    }
+
+
+@app.get("/{collection_name}/{year}/tilejson.json")
+async def get_tilejson(request: Request, collection_name: str, year: str):
+    return await asyncio.to_thread(build_tilejson, request, collection_name, year, None)
+
+
+@app.get("/{collection_name}/{year}/{specie}/tilejson.json")
+async def get_specie_tilejson(request: Request, collection_name: str, year: str, specie: str):
+    return await asyncio.to_thread(build_tilejson, request, collection_name, year, specie)
+
+
+def get_tilesize(tilesize: int, scale: int) -> int:
+    """ Pixel size of a tile from the tilesize query parameter and the @2x suffix. """
+    if tilesize not in (256, 512) or scale not in (1, 2) or tilesize * scale > 512:
+        raise HTTPException(status_code=422, detail="Tiles are 256 or 512 pixels wide: tilesize=512 or @2x")
+    return tilesize * scale
+
+
+@app.get("/{collection_name}/{year}/{z}/{x}/{y}.{ext}")
+@app.get("/{collection_name}/{year}/{z}/{x}/{y}@{scale}x.{ext}")
+async def serve_collection_tile(
+    request: Request, collection_name: str, year: str, z: int, x: int, y: int, ext: str, asv: bool = True,
+    render: str = "color", vmin: float | None = None, vmax: float | None = None, hide: list[int] = Query([]),
+    mosaic: str = "first", tilesize: int = 256, scale: int = 1
+) -> Response:
+    """Serve tiles from a predefined COG collection, as png, webp or jpg.
+
+    With render=data, bathy and habitat maps are colored on the fly from their single-band data COG:
+    vmin/vmax stretch the depth ramp and hide makes habitat classes transparent. mosaic=mean averages
+    the depths of overlapping bathy surveys instead of taking the first one.
+    High-DPI clients ask 512 pixels tiles with {y}@2x.png or tilesize=512.
+    """
+
+    if render not in ("color", "data"):
+        raise HTTPException(status_code=422, detail="render must be color or data")
+    if (vmin == None) != (vmax == None) or (vmin != None and vmin == vmax):
+        raise HTTPException(status_code=422, detail="vmin and vmax must be given together and differ")
+    if mosaic not in ("first", "mean") or (mosaic == "mean" and (render != "data" or collection_name != ManagerType.BATHY.value)):
+        raise HTTPException(status_code=422, detail="mosaic must be first, or mean for bathy with render=data")
+
+    img_format, vary_accept = get_tile_format(collection_name, ext, request)
+
+    # Get bounding box from x, y, z
+    tms = morecantile.tms.get("WebMercatorQuad")  # default TiTiler TMS
+    bb = tms.bounds(x, y, z)
+    params = ParametersCOG(
+        x, y, z, bb, with_asv=asv, render=render,
+        value_range=None if vmin == None else (vmin, vmax),
+        hidden=tuple(sorted(set(hide))),
+        mosaic=mosaic,
+        img_format=img_format,
+        tilesize=get_tilesize(tilesize, scale)
+    )
+
+    return await serve_tile(request, collection_name, year, None, params, vary_accept)
+
+
+@app.get("/{collection_name}/{year}/{specie}/{z}/{x}/{y}.{ext}")
+@app.get("/{collection_name}/{year}/{specie}/{z}/{x}/{y}@{scale}x.{ext}")
+async def serve_collection_specie_tile(
+    request: Request, collection_name: str, year: str, specie: str, z: int, x: int, y: int, ext: str, tilesize: int = 256, scale: int = 1
+) -> Response:
+    """Serve tiles from a predefined COG collection split by specie"""
+
+    img_format, vary_accept = get_tile_format(collection_name, ext, request)
+
+    # Get bounding box from x, y, z
+    tms = morecantile.tms.get("WebMercatorQuad")  # default TiTiler TMS
+    bb = tms.bounds(x, y, z)
+    params = ParametersCOG(x, y, z, bb, with_asv=False, img_format=img_format, tilesize=get_tilesize(tilesize, scale))
+
+    return await serve_tile(request, collection_name, year, specie, params, vary_accept)
+
+
+def split_layer_id(layer_id: str) -> tuple[str, str]:
+    """ Split a layer id like pred_ign_2023 into its type and its year. """
+    layer_split = layer_id.split("_")
+    return '_'.join(layer_split[0:len(layer_split)-1]), layer_split[-1]
+
+
+def query_layers(lon: float, lat: float, layers_id: list[str]) -> tuple[str, float | str | None]:
+    """ Return the first depth or prediction found at the point, layers are tried in order. """
+    layer_type, value = "", None
+    for layer_id in layers_id:
+        if ManagerType.PRED_ASV.value in layer_id: continue
+        layer_type, layer_year = split_layer_id(layer_id)
+        if ManagerType.BATHY.value in layer_id:
+            value = general_manager.get_depth(lon, lat, layer_year)
+        elif ManagerType.PRED_DRONE.value in layer_id:
+            value = general_manager.get_prediction_drone(lon, lat, layer_year)
+        elif ManagerType.PRED_IGN.value in layer_id:
+            value = general_manager.get_prediction_ign(lon, lat, layer_year)
+
+        if value != None: break
+
+    return layer_type, value
+
+
 @app.get("/depthOrprediction")
 async def get_prediction(lon: float = Query(...), lat: float = Query(...), layers_id: list[str] = Query(...)) -> dict:
     """Return prediction or depth at clicked point."""
 
     try:
-        layer_type, value = "", None
-        for layer_id in layers_id:
-            if ManagerType.PRED_ASV.value in layer_id: continue
-            layer_split = layer_id.split("_")
-            layer_year = layer_split[-1]
-            layer_type = '_'.join(layer_split[0:len(layer_split)-1])
-            if ManagerType.BATHY.value in layer_id:
-                value = general_manager.get_depth(lon, lat, layer_year)
-            elif ManagerType.PRED_DRONE.value in layer_id:
-                value = general_manager.get_prediction_drone(lon, lat, layer_year)
-            elif ManagerType.PRED_IGN.value in layer_id:
-                value = general_manager.get_prediction_ign(lon, lat, layer_year)
-
-            if value != None: break
+        layer_type, value = await render_executor.run(query_layers, lon, lat, layers_id)
 
         return {
             "lon": lon, 
@@ -116,40 +324,79 @@ async def get_prediction(lon: float = Query(...), lat: float = Query(...), layer
             "type": layer_type,
             "value": value
         }
+    except RenderQueueFull:
+        raise_busy()
     except Exception as e:
+        logger.exception(f"Failed to query {layers_id} at {lon}, {lat}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@app.get("/layers")
-async def get_layers():
+class PointsQuery(BaseModel):
+    lon: list[float]
+    lat: list[float]
+    layers_id: list[str]
+
+
+def query_layers_points(query: PointsQuery) -> dict:
+    """ Sample every layer at every point, one column of values by layer. """
+    lons, lats = np.asarray(query.lon, dtype=np.float64), np.asarray(query.lat, dtype=np.float64)
+
+    values_by_layer = {}
+    for layer_id in query.layers_id:
+        layer_type, layer_year = split_layer_id(layer_id)
+        if layer_type == ManagerType.BATHY.value:
+            values_by_layer[layer_id] = general_manager.get_depths(lons, lats, layer_year)
+        elif layer_type == ManagerType.PRED_DRONE.value:
+            values_by_layer[layer_id] = general_manager.get_predictions_drone(lons, lats, layer_year)
+        elif layer_type == ManagerType.PRED_IGN.value:
+            values_by_layer[layer_id] = general_manager.get_predictions_ign(lons, lats, layer_year)
+
+    return {
+        "lon": query.lon,
+        "lat": query.lat,
+        "layers": values_by_layer
+    }
+
+
+@app.post("/depthOrprediction")
+async def get_prediction_points(query: PointsQuery) -> dict:
+    """Return depth and prediction of several layers at many points, as columns."""
+
+    if len(query.lon) != len(query.lat):
+        raise HTTPException(status_code=422, detail="lon and lat must have the same length")
+    if len(query.lon) > settings.MAX_BATCH_POINTS:
+        raise HTTPException(status_code=413, detail=f"Too many points, the limit is {settings.MAX_BATCH_POINTS}")
 
-    layers = []
     try:
-        for type_path in sorted(list(GLOBAL_DATA_PATH.iterdir())):
-            if not type_path.is_dir() or type_path.name == ManagerType.PRED_ASV.value: continue
-            for year in sorted(list(type_path.iterdir())):
-                layers.append({
-                    "id": f"{type_path.name}_{year.name}",
-                    "name": f"{ManagerType.get_displayable_name(type_path.name)} {year.name}",
-                    "url": f"/{type_path.name}/{year.name}"+"/{z}/{x}/{y}.png",
-                    "attribution": ManagerType.get_attribution(type_path.name),
-                    "description":  ManagerType.get_description(type_path.name)
-                })
+        return await render_executor.run(query_layers_points, query)
+    except RenderQueueFull:
+        raise_busy()
     except Exception as e:
+        logger.exception(f"Failed to query {query.layers_id} at {len(query.lon)} points")
         raise HTTPException(status_code=500, detail="Internal server error")
-    return layers
 
 
-@app.get("/filters-asv")
-async def get_filters():
-    asv_color =  general_manager.pred_asv_manager.get_color_pred_asv_by_specie()
+def catalog_response(request: Request, entry: CatalogEntry) -> Response:
+    """ Answer 304 when the client already has this version of the document. """
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if entry.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+@app.get("/layers")
+async def get_layers(request: Request):
+    try:
+        entry = await asyncio.to_thread(catalog.get, "layers")
+    except Exception as e:
+        logger.exception("Failed to list layers")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    return catalog_response(request, entry)
 
-    filters = {
-        "species": [{"name":s, "color": '#%02x%02x%02x' % tuple(asv_color.get(s, [127, 127, 127]))}  for s in general_manager.pred_asv_manager.species], 
-        "years": sorted([int(y.name) for y in general_manager.pred_asv_manager.pred_data_path.iterdir() if y.is_dir()])
-    }
 
-    return filters
+@app.get("/filters-asv")
+async def get_filters(request: Request):
+    return catalog_response(request, await asyncio.to_thread(catalog.get, "filters-asv"))
 
 
 @app.get("/get-layer")
@@ -173,13 +420,54 @@ async def get_specific_layer(year: str, specie: str):
     return layer
 
 @app.get("/get-all-legend")
-async def get_legend():
+async def get_legend(request: Request):
+    return catalog_response(request, await asyncio.to_thread(catalog.get, "legends"))
+
+
+@app.get("/health")
+async def get_health():
+    """ Readiness of the worker, and years indexed so far by collection. Years are indexed on first access, they don't delay readiness. """
+    collections = general_manager.status()
+    return {
+        "status": "ready",
+        "indexed": all(c["indexed"] for c in collections.values()),
+        "collections": collections,
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    """ Cache counters of this worker, for monitoring. """
+    return {
+        "readers": reader_cache.stats(),
+        "tile_cache": tile_cache.stats(),
+        "single_flight": tile_flights.stats(),
+        "last_reload": data_reloader.last_reload,
+        "catalog_version": catalog.version,
+    }
+
+
+@app.post("/admin/reload")
+async def reload_data(x_admin_token: str | None = Header(default=None)):
+    """ Reload the data folder now in this worker, the other workers follow within a second. """
+    if settings.ADMIN_TOKEN == "":
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled, set COG_SERVER_ADMIN_TOKEN")
+    if x_admin_token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+    data_reloader.request_reload()
+    return await asyncio.to_thread(data_reloader.reload)
+
 
-    legends = [
-        general_manager.bathy_manager.get_legend(),
-        general_manager.pred_drone_manager.get_legend(),
-        general_manager.pred_ign_manager.get_legend()
-    ]
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """ Tile latency histograms by collection and zoom level, in Prometheus format. """
+    readers = reader_cache.stats()
+    caches = tile_cache.stats()
 
-    return legends
-pass
\ No newline at end of file
+    return tile_metrics.render({
+        "cog_server_reader_open_handles": readers["open_handles"],
+        "cog_server_reader_estimated_bytes": readers["estimated_bytes"],
+        "cog_server_tile_cache_memory_bytes": caches["memory_bytes"],
+        "cog_server_tile_cache_memory_entries": caches["memory_entries"],
+    })
@@ -0,0 +1,74 @@
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MBTilesArchive:
+    """ Read-only MBTiles file of prerendered tiles for one collection year. """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._local = threading.local()
+
+        st = path.stat()
+        self.fingerprint = f"{path.name}:{st.st_mtime_ns}:{st.st_size}"
+
+        metadata = dict(self._connect().execute("SELECT name, value FROM metadata").fetchall())
+        self.img_format = metadata.get("format", "png")
+        self.minzoom = int(metadata.get("minzoom", 0))
+        self.maxzoom = int(metadata.get("maxzoom", 24))
+        self.with_asv = metadata.get("with_asv", "1") == "1"
+
+
+    def _connect(self) -> sqlite3.Connection:
+        """ The archive never changes while served: open it immutable and memory mapped, one connection per thread. """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA mmap_size=1073741824")
+            self._local.conn = conn
+        return conn
+
+
+    def covers(self, z: int, with_asv: bool, img_format: str) -> bool:
+        """ True when the archive holds the answer for this zoom and render parameters. """
+        return self.minzoom <= z <= self.maxzoom and self.with_asv == with_asv and self.img_format == img_format
+
+
+    def get_tile(self, z: int, x: int, y: int) -> bytes | None:
+        """ Tile bytes, None when the archive has no data there. MBTiles rows are in TMS order. """
+        row = self._connect().execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, (1 << z) - 1 - y)
+        ).fetchone()
+        return None if row is None else row[0]
+
+
+class ArchiveStore:
+    """ Archives found under <archive_path>/<collection>/<year>.mbtiles (<year>_<specie>.mbtiles for ASV predictions). """
+
+    def __init__(self, archive_path: Path) -> None:
+        self.archive_path = archive_path
+        self.archives: dict[tuple[str, str], MBTilesArchive] = {}
+
+        if not self.archive_path.exists(): return
+
+        for path in sorted(self.archive_path.glob("*/*.mbtiles")):
+            try:
+                self.archives[(path.parent.name, path.stem)] = MBTilesArchive(path)
+                logger.info(f"Serving {path} before the COG")
+            except sqlite3.Error as e:
+                logger.error(f"Cannot open archive {path}: {e}")
+
+
+    @staticmethod
+    def get_name(year: str, specie: str | None) -> str:
+        return year if specie == None else f"{year}_{specie}"
+
+
+    def get(self, collection_type: str, year: str, specie: str | None) -> MBTilesArchive | None:
+        return self.archives.get((collection_type, self.get_name(year, specie)), None)
@@ -1,20 +1,57 @@
+import os
+import time
+import hashlib
 import logging
+import functools
 import pyqtree
 import numpy as np
+import morecantile
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from contextlib import contextmanager
 from abc import ABC, abstractmethod
 from morecantile.commons import BoundingBox
 
 from rio_tiler.io import COGReader
 from rio_tiler.models import ImageData
 
-import rasterio
-from rasterio.warp import transform_bounds
+from .cog_index import CogInfo, cog_index_store, get_zoom_range
+from .tools import bounds_to_tile_window
+from .mosaic import MosaicMethod, FirstMethod
+from .point import point_sampler
+from .colormap import load_colormap
+from .registry import LazyRegistry
+from .overview import TMS, overview_store, year_fingerprint
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@dataclass
+class TileStats:
+    sources: int = 0        # COG intersecting the tile in the index
+    read: int = 0           # COG actually read
+    skipped: int = 0        # COG not read because the pixels they cover were already filled
+    masked: int = 0         # COG whose bounding box intersects the tile but not their valid-data footprint
+    bytes_read: int = 0     # Decoded pixel bytes returned by the readers
+    cache: str = "none"     # Tile cache result: memory, disk, miss or none when not looked up
+    timings: dict[str, float] = field(default_factory=dict)  # Milliseconds spent by stage
+
+    @contextmanager
+    def stage(self, name: str):
+        """ Add the time spent in the block to a stage. """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def to_header(self) -> str:
+        return f"sources={self.sources}, read={self.read}, skipped={self.skipped}, masked={self.masked}"
+
+    def to_server_timing(self) -> str:
+        return ", ".join(f"{name};dur={duration:.2f}" for name, duration in self.timings.items())
+
+
 @dataclass
 class ParametersCOG:
     x: int
@@ -22,54 +59,396 @@ class ParametersCOG:
     z: int
     bb: BoundingBox
     with_asv: bool
+    render: str = "color"                           # color: 4-band color COG, data: single-band data COG and a color ramp
+    value_range: tuple[float, float] | None = None  # Range the color ramp is stretched on, for continuous data
+    hidden: tuple[int, ...] = ()                    # Classes rendered transparent, for categorical data
+    mosaic: str = "first"                           # mean: average the values of the data COG over overlaps, for continuous data
+    img_format: str = "png"                         # png, webp or jpg
+    tilesize: int = 256                             # 512 for @2x tiles
+    stats: TileStats = field(default_factory=TileStats)
+    etag: str | None = None                         # Set by the renderer from the tile sources, None for empty tiles
+
+    def style_key(self) -> str:
+        """ Identify the rendering options, part of the tile cache key. """
+        size = "" if self.tilesize == 256 else f"@{self.tilesize}"
+        if self.render != "data":
+            return f"{self.render}{size}"
+        value_range = "" if self.value_range == None else ",".join(str(v) for v in self.value_range)
+        mosaic = "" if self.mosaic == "first" else f":{self.mosaic}"
+        return f"data:{value_range}:{','.join(str(h) for h in sorted(self.hidden))}{mosaic}{size}"
+
+import math
+from collections import OrderedDict, deque
+from threading import Condition, RLock
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from . import settings
+
+# Memory kept by GDAL for an open handle, on top of its tile index.
+READER_BASE_BYTES = 64 * 1024
+
+
+class PooledReader:
+    """
+    Handles of one COG. GDAL handles must not be shared by two threads at the same time, concurrent tiles of
+    the same COG each borrow their own handle, up to max_handles, then wait for one to be returned.
+    """
+
+    def __init__(self, path: Path, max_handles: int) -> None:
+        self.path = path
+        self.max_handles = max(max_handles, 1)
+        reader = COGReader(path)
+        self.handles = [reader]
+        self.idle = [reader]
+        self.opening = 0
+        self.closed = False
+        self.condition = Condition()
+        self.handle_bytes = self.estimate_bytes(reader)
+        # Handles and bytes counted in the budget of the cache.
+        self.nb_counted = 1
+        self.nbytes = self.handle_bytes
+
+    @staticmethod
+    def estimate_bytes(reader: COGReader) -> int:
+        """ Approximate the memory of a handle by the size of the tile offsets and byte counts of every level. """
+        dataset = reader.dataset
+        block_height, block_width = dataset.block_shapes[0]
+        nb_blocks = 0
+        for factor in [1] + dataset.overviews(1):
+            width, height = math.ceil(dataset.width / factor), math.ceil(dataset.height / factor)
+            nb_blocks += math.ceil(width / block_width) * math.ceil(height / block_height)
+        return READER_BASE_BYTES + nb_blocks * 16
+
+    def acquire(self) -> tuple[COGReader | None, bool]:
+        """ Borrow an idle handle or open a new one. Return None once closed, and whether the handle is new. """
+        with self.condition:
+            while True:
+                if self.closed:
+                    return None, False
+                if len(self.idle) > 0:
+                    return self.idle.pop(), False
+                if len(self.handles) + self.opening < self.max_handles:
+                    self.opening += 1
+                    break
+                self.condition.wait()
+
+        # Open outside of the lock, the other threads keep returning and borrowing handles.
+        try:
+            reader = COGReader(self.path)
+        finally:
+            with self.condition:
+                self.opening -= 1
+
+        with self.condition:
+            if not self.closed:
+                self.handles.append(reader)
+                return reader, True
+        reader.close()
+        return None, False
+
+    def release(self, reader: COGReader) -> None:
+        with self.condition:
+            if not self.closed:
+                self.idle.append(reader)
+                self.condition.notify()
+                return
+            self.handles.remove(reader)
+        reader.close()
+
+    def close(self) -> None:
+        """ Close the idle handles now and the borrowed ones when they are returned. """
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            for reader in idle:
+                self.handles.remove(reader)
+            self.condition.notify_all()
+
+        for reader in idle:
+            reader.close()
 
-from collections import OrderedDict
-from threading import RLock
 
 class ReaderCache:
-    def __init__(self, maxsize=20):
-        self.maxsize = maxsize
-        self._cache = OrderedDict()
+    """ Process-wide LRU of COGReader shared by every manager, bounded in handles and in estimated bytes. """
+
+    def __init__(self, max_handles: int, max_bytes: int, handles_per_cog: int):
+        self.max_handles = max_handles
+        self.max_bytes = max_bytes
+        self.handles_per_cog = handles_per_cog
+        self.current_bytes = 0
+        self.current_handles = 0
+        self._cache: OrderedDict[Path, PooledReader] = OrderedDict()
         self._lock = RLock()
+        self._counters: dict[str, dict[str, int]] = {}
+
+    @staticmethod
+    def get_collection(path: Path) -> str:
+        """ Files are stored in <collection>/<year>/<file>. """
+        return path.parent.parent.name
 
-    def get(self, path: Path) -> COGReader:
+    def _count(self, path: Path, counter: str) -> None:
+        counters = self._counters.setdefault(self.get_collection(path), {"hits": 0, "misses": 0, "evictions": 0})
+        counters[counter] += 1
+
+    def _get_entry(self, path: Path) -> PooledReader:
         with self._lock:
-            reader = self._cache.get(path)
-            if reader is not None:
+            entry = self._cache.get(path)
+            if entry is not None:
                 # Move to the end (mark as recently used)
                 self._cache.move_to_end(path)
-                return reader
+                self._count(path, "hits")
+                return entry
 
-            # Not cached → open a new one
-            reader = COGReader(path)
-            self._cache[path] = reader
+        # Not cached → open a new one, outside of the lock to not block other readers
+        new_entry = PooledReader(path, self.handles_per_cog)
 
-            # Evict oldest if over capacity
-            if len(self._cache) > self.maxsize:
-                old_path, old_reader = self._cache.popitem(last=False)
-                try:
-                    old_reader.close()
-                except Exception as e:
-                    logger.warning(f"Failed to close COGReader for {old_path}: {e}")
+        evicted = []
+        with self._lock:
+            entry = self._cache.get(path)
+            if entry is None:
+                entry = self._cache[path] = new_entry
+                self.current_bytes += entry.nbytes
+                self.current_handles += 1
+                self._count(path, "misses")
+            else:
+                # Another thread opened it meanwhile.
+                evicted.append((path, new_entry))
+            evicted += self._evict_over_budget()
+
+        for old_path, old_entry in evicted:
+            self._close(old_path, old_entry)
+
+        return entry
+
+    def _evict_over_budget(self) -> list[tuple[Path, PooledReader]]:
+        """ Remove the least recently used COG until the cache fits its budget, called with the lock held. """
+        evicted = []
+        while len(self._cache) > 1 and (self.current_handles > self.max_handles or self.current_bytes > self.max_bytes):
+            old_path, old_entry = self._cache.popitem(last=False)
+            self._forget(old_entry)
+            self._count(old_path, "evictions")
+            evicted.append((old_path, old_entry))
+        return evicted
+
+    def _forget(self, entry: PooledReader) -> None:
+        self.current_bytes -= entry.nbytes
+        self.current_handles -= entry.nb_counted
+
+    def _add_handle(self, entry: PooledReader) -> None:
+        """ Count a handle opened for concurrent reads of a cached COG. """
+        evicted = []
+        with self._lock:
+            if self._cache.get(entry.path) is entry:
+                entry.nb_counted += 1
+                entry.nbytes += entry.handle_bytes
+                self.current_bytes += entry.handle_bytes
+                self.current_handles += 1
+                evicted = self._evict_over_budget()
+
+        for old_path, old_entry in evicted:
+            self._close(old_path, old_entry)
+
+    def _close(self, path: Path, entry: PooledReader) -> None:
+        try:
+            entry.close()
+        except Exception as e:
+            logger.warning(f"Failed to close COGReader for {path}: {e}")
+
+    @contextmanager
+    def open(self, path: Path):
+        """ Borrow a handle of the COG for the time of the block. """
+        while True:
+            entry = self._get_entry(path)
+            reader, is_new = entry.acquire()
+            # The reader may have been evicted between the lookup and the borrow.
+            if reader is None:
+                continue
+
+            if is_new:
+                self._add_handle(entry)
+            try:
+                yield reader
+            finally:
+                entry.release(reader)
+            return
+
+    def evict(self, path: Path) -> None:
+        """ Close the readers of a file, for instance after it has been replaced. """
+        with self._lock:
+            entry = self._cache.pop(path, None)
+            if entry is not None:
+                self._forget(entry)
 
-            return reader
+        if entry is not None:
+            self._close(path, entry)
 
     def clear(self):
         """Close all readers and empty the cache."""
         with self._lock:
-            for path, reader in self._cache.items():
-                try:
-                    reader.close()
-                except Exception as e:
-                    logger.warning(f"Failed to close COGReader for {path}: {e}")
+            entries = list(self._cache.items())
             self._cache.clear()
+            self.current_bytes = 0
+            self.current_handles = 0
+
+        for path, entry in entries:
+            self._close(path, entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            open_by_collection = {}
+            for path in self._cache:
+                collection = self.get_collection(path)
+                open_by_collection[collection] = open_by_collection.get(collection, 0) + 1
+
+            return {
+                "open_cogs": len(self._cache),
+                "open_handles": self.current_handles,
+                "max_handles": self.max_handles,
+                "estimated_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "collections": {
+                    collection: {**counters, "open": open_by_collection.get(collection, 0)}
+                    for collection, counters in self._counters.items()
+                }
+            }
+
+
+reader_cache = ReaderCache(settings.READER_MAX_HANDLES, settings.READER_MAX_MB * 1024 * 1024, settings.READER_HANDLES_PER_COG)
+
+# Source reads of every tile in flight, GDAL releases the GIL while decoding.
+source_read_pool = ThreadPoolExecutor(max_workers=settings.READ_THREADS, thread_name_prefix="read")
+
+
+@dataclass
+class TileCoverage:
+    bounds: tuple[float, float, float, float]  # EPSG:4326 extent of the COG
+    minzoom: int                               # Coarsest overview
+    maxzoom: int                               # Native resolution
+
+    @classmethod
+    def from_infos(cls, infos: list[CogInfo]) -> "TileCoverage":
+        minzoom, maxzoom = get_zoom_range(infos)
+        return cls(
+            bounds=(min(i.bounds[0] for i in infos), min(i.bounds[1] for i in infos), max(i.bounds[2] for i in infos), max(i.bounds[3] for i in infos)),
+            minzoom=minzoom,
+            maxzoom=maxzoom,
+        )
+
+    def excludes(self, z: int, bb: BoundingBox, max_overzoom: int) -> bool:
+        """ True when the tile is certainly empty: outside the extent or too deep in overzoom. """
+        if z > self.maxzoom + max_overzoom:
+            return True
+        return bb.left >= self.bounds[2] or bb.right <= self.bounds[0] or bb.bottom >= self.bounds[3] or bb.top <= self.bounds[1]
+
+
+def folder_signature(folder: Path) -> dict[str, tuple[int, int]]:
+    """ Mtime and size of each file of a year folder, to detect added, modified and removed files. """
+    signature = {}
+    for file in folder.iterdir():
+        if not file.is_file(): continue
+        st = os.stat(file)
+        signature[file.name] = (st.st_mtime_ns, st.st_size)
+    return signature
+
+
+def signature_fingerprint(signature: dict[str, tuple[int, int]]) -> str:
+    """ Hash of a folder signature, identifies the version of a year folder. """
+    h = hashlib.blake2b(digest_size=16)
+    for name, (mtime_ns, size) in sorted(signature.items()):
+        h.update(f"{name}:{mtime_ns}:{size};".encode())
+    return h.hexdigest()
+
+
+@dataclass
+class DataChange:
+    paths: list[Path]                                           # Files added, modified or removed
+    bounds: list[tuple[float, float, float, float]] | None      # EPSG:4326 bounds of the changed COG, None when unknown
+
+
+def diff_years(folder: Path, old, new) -> DataChange:
+    """ Compare two versions of a year manager, either may be None when the year was added or removed. """
+    old_signature = old.folder_signature if old != None else {}
+    new_signature = new.folder_signature if new != None else {}
+    old_infos: dict[Path, CogInfo] = old.cog_infos if old != None else {}
+    new_infos: dict[Path, CogInfo] = new.cog_infos if new != None else {}
+
+    paths = [Path(folder, name) for name in sorted(set(old_signature) | set(new_signature)) if old_signature.get(name) != new_signature.get(name)]
+
+    bounds = []
+    for path in paths:
+        infos = [info for info in (old_infos.get(path), new_infos.get(path)) if info != None]
+        if len(infos) == 0:
+            # Data file or file outside the index: its extent is unknown.
+            return DataChange(paths, None)
+        bounds += [info.bounds for info in infos]
+
+    return DataChange(paths, bounds)
+
+
+def list_years(data_path: Path) -> list[str]:
+    return sorted(year_path.name for year_path in data_path.iterdir() if year_path.is_dir())
+
+
+def load_years(data_path: Path, year_class: type) -> LazyRegistry:
+    """ Registry of the year folders of a collection, each year indexed on first access. """
+    return LazyRegistry(list_years(data_path), lambda year: year_class(Path(data_path, year)))
+
+
+def reload_years(cog_by_year: LazyRegistry, data_path: Path, year_class: type) -> tuple[LazyRegistry, dict[str, DataChange]]:
+    """ Rebuild the loaded years whose folder changed, keep the others. Return the new registry and the changes by year. """
+    unchanged = list_years(data_path) == cog_by_year.names and all(
+        old.folder_signature == folder_signature(Path(data_path, year)) for year, old in cog_by_year.loaded().items()
+    )
+    if unchanged:
+        # Keep the registry, its loaded years and the catalog built on it. Years that failed to load are tried again.
+        cog_by_year.clear_errors()
+        return cog_by_year, {}
+
+    new_cog_by_year, changes = load_years(data_path, year_class), {}
+
+    for year, old in cog_by_year.loaded().items():
+        year_path = Path(data_path, year)
+        if year not in new_cog_by_year:
+            changes[year] = diff_years(year_path, old, None)
+            continue
+
+        if old.folder_signature == folder_signature(year_path):
+            new_cog_by_year.set(year, old)
+            continue
+
+        try:
+            new = year_class(year_path)
+        except Exception:
+            # A survey may still be copying, keep serving the previous version until the next reload.
+            logger.exception(f"Cannot load {year_path}")
+            new_cog_by_year.set(year, old)
+            continue
+
+        new_cog_by_year.set(year, new)
+        changes[year] = diff_years(year_path, old, new)
+
+    # Years not loaded yet are built from the new folder content on first access.
+    return new_cog_by_year, changes
 
 
 class BaseManager(ABC):
 
+    # How overlapping COG are merged, see src/mosaic.py.
+    mosaic_method: type[MosaicMethod] = FirstMethod
+
+    # Color ramp of the single-band data COG, None when the collection has only color COG.
+    colormap_path: Path | None = None
+    colormap_categorical: bool = False
+
+    # Data value meaning no measure, on top of the nodata declared by the data COG. Points on it fall through to the next COG.
+    point_nodata: float | None = None
+
+    # The sources of a tile depend on with_asv, the overview is built with ASV surveys.
+    filters_asv: bool = False
+
     def __init__(self):
         super().__init__()
-        self.reader_cache = ReaderCache(maxsize=32)
+        self.reader_cache = reader_cache
 
 
     @property
@@ -82,20 +461,10 @@ class BaseManager(ABC):
     def create_index(self, list_rasters: list[Path]) -> pyqtree.Index:
         """This function create a quadtree index with all the cog raster."""
 
-        bounds_list = []
-
-        for path in list_rasters:
-            with rasterio.open(path) as src:
-                bounds = src.bounds  # (minx, miny, maxx, maxy)
-                bounds_list.append({
-                    "name": path,
-                    "bounds": bounds
-                })
-
-        for b in bounds_list:
-            with rasterio.open(b["name"]) as src:
-                b["bounds"] = transform_bounds(src.crs, "EPSG:4326", *b["bounds"])
+        # Metadata comes from the persisted manifest, only new or modified rasters are opened.
+        self.cog_infos = cog_index_store.load(list_rasters)
 
+        bounds_list = [{"name": path, "bounds": info.bounds} for path, info in self.cog_infos.items()]
 
         # Calculate global extent (min/max of all bounds)
         all_minx = min(b["bounds"][0] for b in bounds_list)
@@ -112,41 +481,272 @@ class BaseManager(ABC):
         return spindex
 
 
+    @functools.cached_property
+    def coverage(self) -> TileCoverage:
+        """ Extent and zoom range of the indexed COG, the index never changes after creation. """
+        return TileCoverage.from_infos(list(self.cog_infos.values()))
+
+
+    @property
+    def overview_key(self) -> str:
+        """ Name of the overview of the year: <collection>/<year>. """
+        folder = next(iter(self.cog_infos)).parent
+        return f"{folder.parent.name}/{folder.name}"
+
+
+    @functools.cached_property
+    def index_fingerprint(self) -> str:
+        return year_fingerprint(self.cog_infos)
+
+
+    def get_overview(self, p: ParametersCOG) -> Path | None:
+        """ Pre-merged overview serving the tile, None to read the COG. Schedules its build when missing or outdated. """
+        if p.z >= overview_store.min_zoom or p.render != "color" or (self.filters_asv and not p.with_asv):
+            return None
+
+        overview_path = overview_store.get(self.overview_key, self.index_fingerprint)
+        if overview_path == None:
+            self.schedule_overview()
+        return overview_path
+
+
+    def schedule_overview(self) -> None:
+        overview_store.schedule(self.overview_key, self.cog_infos, self.get_overview_sources, self.render_overview_tile)
+
+
+    def build_overview(self) -> dict | None:
+        return overview_store.build(self.overview_key, self.cog_infos, self.get_overview_sources, self.render_overview_tile)
+
+
+    def get_overview_sources(self, tile: morecantile.Tile) -> list[Path]:
+        return self.get_tile_sources(ParametersCOG(tile.x, tile.y, tile.z, TMS.bounds(tile), with_asv=True))
+
+
+    def render_overview_tile(self, tile: morecantile.Tile) -> np.ndarray | None:
+        p = ParametersCOG(tile.x, tile.y, tile.z, TMS.bounds(tile), with_asv=True)
+        image = self.merge_sources(p, self.get_tile_sources(p))
+        return None if image == None else image.data
+
+
     def get_merge_tiles(self, tiles: list[ImageData]) -> ImageData:
-        """ Merge a list of tile by the first algo. """
-        reference_tile = tiles[0]
-        merged_array = reference_tile.data
+        """ Merge a list of tile with the mosaic method of the manager. """
+        method = self.mosaic_method()
+        for tile in tiles:
+            method.feed(tile.data)
+
+        return ImageData(
+            array=method.result(),
+            crs=tiles[0].crs,
+            bounds=tiles[0].bounds,
+        )
+
+
+    def sample_points(self, lons: np.ndarray, lats: np.ndarray, data_file_by_color: dict[Path, Path]) -> np.ndarray:
+        """ Sample the data rasters at many points, the first COG with a value wins. """
+        values = np.full(len(lons), np.nan, dtype=np.float64)
+
+        # Group the points by COG through the spatial index.
+        points_by_cog: dict[Path, list[int]] = {}
+        for i, (lon, lat) in enumerate(zip(lons, lats)):
+            for cog in sorted(self.spindex.intersect((lon, lat, lon, lat))):
+                points_by_cog.setdefault(cog, []).append(i)
+
+        for cog in sorted(points_by_cog):
+            data_path = data_file_by_color.get(cog, None)
+            if data_path == None or not data_path.exists():
+                continue
+
+            idx = np.array(points_by_cog[cog])
+            idx = idx[np.isnan(values[idx])]
+            if len(idx) == 0:
+                continue
+
+            sampled = point_sampler.sample(data_path, lons[idx], lats[idx])
+            if self.point_nodata != None:
+                sampled[sampled == self.point_nodata] = np.nan
+            values[idx] = sampled
+
+        return values
 
-        for sub_tile in tiles[1:]:
 
-            tile_array = sub_tile.data
+    def get_data_file(self, file: Path) -> Path | None:
+        """ Return the single-band data COG of a color COG. """
+        return None
 
-            for i in range(3):
-                merged_array[i, ...] = np.where(merged_array[3, ...] != 0, merged_array[i, ...], tile_array[i, ...])
-                                                    
-            merged_array[3, ...] = np.where(merged_array[3, ...] != 0, merged_array[3, ...], tile_array[3, ...])
 
+    def read_data(self, data_path: Path, p: ParametersCOG) -> tuple[ImageData, np.ndarray, np.ndarray]:
+        """ Read the tile of a single-band data COG, return it with its values and its valid pixels. """
+        with self.reader_cache.open(data_path) as reader:
+            data_tile = reader.tile(p.x, p.y, p.z, tilesize=p.tilesize, indexes=1)
+
+        band = data_tile.array[0]
+        valid = ~np.ma.getmaskarray(band)
+        if np.issubdtype(band.dtype, np.floating):
+            valid &= ~np.isnan(band.data)
+        return data_tile, band.data, valid
+
+
+    def read_source(self, file: Path, p: ParametersCOG) -> ImageData:
+        """ Read the RGBA tile of a source, from the color COG or by coloring its data COG. """
+        data_path = self.get_data_file(file) if p.render == "data" and self.colormap_path != None else None
+
+        if data_path == None:
+            with self.reader_cache.open(file) as reader:
+                return reader.tile(p.x, p.y, p.z, tilesize=p.tilesize, indexes=(1, 2, 3, 4))
+
+        data_tile, values, valid = self.read_data(data_path, p)
+        colormap = load_colormap(self.colormap_path, self.colormap_categorical)
         return ImageData(
-            array=merged_array,
-            crs=reference_tile.crs,
-            bounds=reference_tile.bounds,
+            array=colormap.apply(values, valid, p.value_range, p.hidden),
+            crs=data_tile.crs,
+            bounds=data_tile.bounds,
         )
 
 
-    def get_tile(self, p: ParametersCOG) -> ImageData | None:
-        """ Get the tile at the given coordinate. """
-        list_cogs_intersect = sorted(self.spindex.intersect((
+    def merge_mean_data(self, p: ParametersCOG, list_cogs_intersect: list[Path]) -> ImageData | None:
+        """ Average the values of the data COG where they overlap, then color: a mean of colors is not on the ramp. """
+        first_tile, total, count = None, None, None
+        for file in list_cogs_intersect:
+            data_path = self.get_data_file(file)
+            if data_path == None:
+                continue
+
+            with p.stats.stage("read"):
+                data_tile, values, valid = self.read_data(data_path, p)
+            p.stats.read += 1
+            p.stats.bytes_read += values.nbytes
+
+            with p.stats.stage("merge"):
+                if first_tile is None:
+                    first_tile = data_tile
+                    total = np.zeros(values.shape, dtype=np.float64)
+                    count = np.zeros(values.shape, dtype=np.uint16)
+                np.add(total, values, out=total, where=valid)
+                np.add(count, 1, out=count, where=valid)
+
+        if first_tile is None:
+            return None
+
+        with p.stats.stage("merge"):
+            valid = count != 0
+            np.divide(total, count, out=total, where=valid)
+            colormap = load_colormap(self.colormap_path, self.colormap_categorical)
+            array = colormap.apply(total, valid, p.value_range, p.hidden)
+
+        return ImageData(array=array, crs=first_tile.crs, bounds=first_tile.bounds)
+
+
+    def filter_footprints(self, list_cogs: list[Path], p: ParametersCOG) -> list[Path]:
+        """ Drop the COG holding only nodata over the tile. """
+        bounds = (p.bb.left, p.bb.bottom, p.bb.right, p.bb.top)
+        kept = []
+        for file in list_cogs:
+            info = self.cog_infos[file]
+            if info.footprint == None or info.footprint.intersects(info.bounds, bounds):
+                kept.append(file)
+
+        p.stats.masked = len(list_cogs) - len(kept)
+        return kept
+
+
+    def get_tile_sources(self, p: ParametersCOG) -> list[Path]:
+        """ Return the COG with valid data in the tile, in merge order. """
+        return self.filter_footprints(sorted(self.spindex.intersect((
             p.bb.left, p.bb.bottom, p.bb.right, p.bb.top
-        )))
+        ))), p)
+
+
+    def get_tile(self, p: ParametersCOG) -> ImageData | None:
+        """ Get the tile at the given coordinate, reading sources until the mosaic is complete. """
+        with p.stats.stage("index"):
+            list_cogs_intersect = self.get_tile_sources(p)
+        p.stats.sources = len(list_cogs_intersect)
 
         if len(list_cogs_intersect) == 0:
             return None
 
-        tiles = []
-        for file in list_cogs_intersect:
-            reader = self.reader_cache.get(file)
-            tiles.append(reader.tile(p.x, p.y, p.z, indexes=(1, 2, 3, 4)))
+        overview_path = self.get_overview(p)
+        if overview_path != None:
+            with p.stats.stage("overview"):
+                with self.reader_cache.open(overview_path) as reader:
+                    tile = reader.tile(p.x, p.y, p.z, tilesize=p.tilesize, indexes=(1, 2, 3, 4))
+            p.stats.read += 1
+            p.stats.skipped += len(list_cogs_intersect)
+            p.stats.bytes_read += tile.data.nbytes
+            return tile
+
+        return self.merge_sources(p, list_cogs_intersect)
 
-        tile = tiles[0] if len(tiles) == 1 else self.get_merge_tiles(tiles)
 
-        return tile
\ No newline at end of file
+    def merge_sources(self, p: ParametersCOG, list_cogs_intersect: list[Path]) -> ImageData | None:
+        """ Read sources in merge order until the mosaic is complete. """
+        if len(list_cogs_intersect) == 0:
+            return None
+
+        if p.mosaic == "mean" and p.render == "data" and self.colormap_path != None:
+            return self.merge_mean_data(p, list_cogs_intersect)
+
+        method = self.mosaic_method()
+        first_tile, nb_read = None, 0
+
+        # Sources read ahead on the shared pool, in merge order. At most READS_PER_TILE by tile so a
+        # low zoom tile with many sources doesn't take every thread.
+        pending: deque[tuple[int, Future]] = deque()
+        next_index = 0
+        try:
+            while next_index < len(list_cogs_intersect) or len(pending) > 0:
+
+                while next_index < len(list_cogs_intersect) and len(pending) < settings.READS_PER_TILE:
+                    file = list_cogs_intersect[next_index]
+                    next_index += 1
+
+                    if method.skip_filled and method.started:
+                        # A source only shows through pixels still empty.
+                        window = bounds_to_tile_window(self.cog_infos[file].bounds, p.bb, method.output.shape[1])
+                        if window is None or method.is_filled(window):
+                            p.stats.skipped += 1
+                            continue
+
+                    if settings.READS_PER_TILE == 1:
+                        future = Future()
+                        with p.stats.stage("read"):
+                            future.set_result(self.read_source(file, p))
+                    else:
+                        future = source_read_pool.submit(self.read_source, file, p)
+                    pending.append((next_index - 1, future))
+
+                if len(pending) == 0:
+                    break
+
+                # Merge in priority order: wait for the first source even if later ones are ready.
+                i, future = pending.popleft()
+                with p.stats.stage("read"):
+                    tile = future.result()
+                if first_tile is None:
+                    first_tile = tile
+                p.stats.bytes_read += tile.data.nbytes
+                nb_read += 1
+
+                with p.stats.stage("merge"):
+                    method.feed(tile.data)
+
+                if method.is_done():
+                    p.stats.skipped += len(list_cogs_intersect) - next_index + len(pending)
+                    break
+        finally:
+            # Reads started ahead but not needed anymore finish in the background.
+            for _, future in pending:
+                future.cancel()
+
+        p.stats.read += nb_read
+        if nb_read == 1:
+            return first_tile
+
+        with p.stats.stage("merge"):
+            array = method.result()
+
+        return ImageData(
+            array=array,
+            crs=first_tile.crs,
+            bounds=first_tile.bounds,
+        )
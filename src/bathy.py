@@ -6,10 +6,8 @@ from rio_tiler.io import COGReader
 from rio_tiler.models import ImageData
 from morecantile.commons import BoundingBox
 
-import rasterio
-from rasterio.warp import transform
-
-from .base import BaseManager
+from .registry import LazyRegistry
+from .base import BaseManager, DataChange, folder_signature, load_years, reload_years
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,9 +15,12 @@ logger = logging.getLogger(__name__)
 
 class BathyCogYear(BaseManager):
 
+    colormap_path = Path("tools/bathy/color.txt")
+
     def __init__(self, bathy_cogs_path: Path) -> None:
         super().__init__()
         self.bathy_cogs_path = bathy_cogs_path
+        self.folder_signature = folder_signature(bathy_cogs_path)
         self.list_color_cogs, self.bathy_file_by_color = self.match_color_depth_file()
         
         self._spindex = self.create_index(self.list_color_cogs)
@@ -50,26 +51,20 @@ class BathyCogYear(BaseManager):
         return list_color_cogs, bathy_file_by_color
 
 
+    def get_data_file(self, file: Path) -> Path | None:
+        return self.bathy_file_by_color.get(file, None)
+
+
     def get_depth(self, lon: float, lat: float) -> float | None:
         """ Return the depth for a given tif at a given location. """
-        list_cogs = self.spindex.intersect((lon, lat, lon, lat))
-        if len(list_cogs) == 0:
-            return None
-        
-        bathy_path = self.bathy_file_by_color.get(list_cogs[0], None)
-        if bathy_path == None or not bathy_path.exists():
-            return None
-        
-        with rasterio.open(bathy_path) as src:
-            raster_crs = src.crs
+        return self.get_depths(np.array([lon]), np.array([lat]))[0]
 
-            # Transform lon/lat (EPSG:4326) into raster CRS
-            xs, ys = transform("EPSG:4326", raster_crs, [lon], [lat])
-            xs, ys = xs[0], ys[0]
 
-            depth = list(src.sample([(xs, ys)]))[0][0]
+    def get_depths(self, lons: np.ndarray, lats: np.ndarray) -> list[float | None]:
+        """ Return the depth at each point. """
+        depths = self.sample_points(lons, lats, self.bathy_file_by_color)
 
-        return None if np.isnan(depth) else depth
+        return [None if np.isnan(d) else d for d in depths.tolist()]
 
 
 class BathyManager:
@@ -90,14 +85,19 @@ class BathyManager:
         return {"title": "Depth (m)", "legend": color_dict, "description": "Click on map to get local depth."}
 
 
-    def load_bathy_cog(self) -> dict[str, BathyCogYear]:
+    def load_bathy_cog(self) -> LazyRegistry:
 
         if not self.bathy_data_path.exists():
             raise FileNotFoundError("Cannot access to bathy data, folder not found")
 
-        bathy_cog_by_year = {byp.name:BathyCogYear(byp) for byp in self.bathy_data_path.iterdir()}
-        
-        return bathy_cog_by_year
+        # Years are indexed on first access.
+        return load_years(self.bathy_data_path, BathyCogYear)
+
+
+    def reload(self) -> dict[str, DataChange]:
+        """ Rebuild the years whose folder changed since the last load. """
+        self.bathy_cog_by_year, changes = reload_years(self.bathy_cog_by_year, self.bathy_data_path, BathyCogYear)
+        return changes
     
 
     def get_tile(self, year: str, bb: BoundingBox) -> ImageData | None:
@@ -125,3 +125,14 @@ class BathyManager:
 
         return depth
 
+
+    def get_depths(self, lons: np.ndarray, lats: np.ndarray, year: str) -> list[float | None]:
+
+        bathy_year_manager = self.bathy_cog_by_year.get(year, None)
+
+        if bathy_year_manager == None:
+            logger.error(f"Bathy for year {year} not found.")
+            return [None] * len(lons)
+
+        return bathy_year_manager.get_depths(lons, lats)
+
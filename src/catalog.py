@@ -0,0 +1,114 @@
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+from .base import TileCoverage
+from .cog_index import cog_index_store
+from .general import GeneralManager, ManagerType
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CatalogEntry:
+    """ One metadata document served to the frontend, with the ETag of its content. """
+
+    def __init__(self, content) -> None:
+        self.content = content
+        self.body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = f'"{hashlib.blake2b(self.body, digest_size=8).hexdigest()}"'
+
+
+class Catalog:
+    """ Layer list, ASV filters and legends built once, rebuilt when a reload swaps the indexes of a collection. """
+
+    def __init__(self, general_manager: GeneralManager) -> None:
+        self.general_manager = general_manager
+        self.version = 0
+        self.entries: dict[str, CatalogEntry] = {}
+
+        self._signature = None
+        self._lock = threading.Lock()
+
+
+    def get_signature(self) -> tuple:
+        """ Changes each time a reload replaces a registry or the ASV colors, and when a year gets indexed. """
+        registries = self.general_manager.get_registries()
+        return tuple((id(registry), len(registry.loaded())) for registry in registries.values()) + (id(self.general_manager.pred_asv_manager.color_asv_pred_by_specie),)
+
+
+    def get(self, name: str) -> CatalogEntry:
+        """ Return an entry, rebuilding the catalog first if the data changed. Never indexes a year. """
+        signature = self.get_signature()
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self.entries = self.build()
+                    self._signature = signature
+                    self.version += 1
+                    logger.info(f"Catalog version {self.version} built")
+        return self.entries[name]
+
+
+    def build(self) -> dict[str, CatalogEntry]:
+        return {
+            "layers": CatalogEntry(self.build_layers()),
+            "filters-asv": CatalogEntry(self.build_filters_asv()),
+            "legends": CatalogEntry(self.build_legends()),
+        }
+
+
+    def build_layers(self) -> list[dict]:
+        layers = []
+        for collection_name, registry in sorted(self.general_manager.get_registries().items()):
+            if collection_name == ManagerType.PRED_ASV.value: continue
+
+            for year in registry:
+                layer = {
+                    "id": f"{collection_name}_{year}",
+                    "name": f"{ManagerType.get_displayable_name(collection_name)} {year}",
+                    "url": f"/{collection_name}/{year}"+"/{z}/{x}/{y}.png",
+                    "attribution": ManagerType.get_attribution(collection_name),
+                    "description":  ManagerType.get_description(collection_name),
+                    "bounds": None,
+                    "minzoom": None,
+                    "maxzoom": None,
+                }
+
+                coverage = self.get_coverage(registry, collection_name, year)
+                if coverage != None:
+                    layer["bounds"] = list(coverage.bounds)
+                    layer["minzoom"], layer["maxzoom"] = coverage.minzoom, coverage.maxzoom
+
+                layers.append(layer)
+        return layers
+
+
+    def get_coverage(self, registry, collection_name: str, year: str) -> TileCoverage | None:
+        """ Coverage of an indexed year, or from the manifest of a previous run. None for a year never indexed. """
+        year_manager = registry.peek(year)
+        if year_manager != None:
+            return year_manager.coverage
+
+        infos = cog_index_store.peek(Path(self.general_manager.data_path, collection_name, year))
+        return TileCoverage.from_infos(infos) if len(infos) > 0 else None
+
+
+    def build_filters_asv(self) -> dict:
+        pred_asv_manager = self.general_manager.pred_asv_manager
+        asv_color = pred_asv_manager.color_asv_pred_by_specie
+
+        return {
+            "species": [{"name":s, "color": '#%02x%02x%02x' % tuple(asv_color.get(s, [127, 127, 127]))}  for s in pred_asv_manager.species],
+            "years": sorted([int(y) for y in pred_asv_manager.pred_cog_by_year])
+        }
+
+
+    def build_legends(self) -> list[dict]:
+        return [
+            self.general_manager.bathy_manager.get_legend(),
+            self.general_manager.pred_drone_manager.get_legend(),
+            self.general_manager.pred_ign_manager.get_legend()
+        ]
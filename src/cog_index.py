@@ -0,0 +1,258 @@
+import os
+import json
+import logging
+import base64
+import threading
+import numpy as np
+from pathlib import Path
+from functools import cached_property
+from dataclasses import dataclass, asdict
+
+import math
+import rasterio
+import morecantile
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.warp import reproject, transform_bounds
+
+from . import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2
+
+# Cells on the longest side of a footprint grid.
+FOOTPRINT_SIZE = 128
+
+
+@dataclass
+class Footprint:
+    """ Coarse grid of the cells of a COG holding valid pixels, in EPSG:4326 over the COG bounds. """
+    width: int
+    height: int
+    bits: str  # Grid packed with np.packbits, base64 encoded
+
+    @cached_property
+    def grid(self) -> np.ndarray:
+        packed = np.frombuffer(base64.b64decode(self.bits), dtype=np.uint8)
+        return np.unpackbits(packed, count=self.width * self.height).reshape(self.height, self.width).astype(bool)
+
+    def intersects(self, cog_bounds: tuple[float, float, float, float], bounds: tuple[float, float, float, float]) -> bool:
+        """ True when bounds (EPSG:4326) touch a valid cell. """
+        minx, miny, maxx, maxy = cog_bounds
+        cell_x, cell_y = (maxx - minx) / self.width, (maxy - miny) / self.height
+
+        col_start = max(int((bounds[0] - minx) // cell_x), 0)
+        col_stop = min(int((bounds[2] - minx) // cell_x) + 1, self.width)
+        row_start = max(int((maxy - bounds[3]) // cell_y), 0)
+        row_stop = min(int((maxy - bounds[1]) // cell_y) + 1, self.height)
+        if col_start >= col_stop or row_start >= row_stop:
+            return False
+
+        return bool(self.grid[row_start:row_stop, col_start:col_stop].any())
+
+
+@dataclass
+class CogInfo:
+    name: str
+    bounds: tuple[float, float, float, float]  # EPSG:4326 (minx, miny, maxx, maxy)
+    crs: str
+    count: int
+    dtype: str
+    width: int
+    height: int
+    res: tuple[float, float]  # In raster CRS units
+    overviews: list[int]
+    mtime_ns: int
+    size: int
+    footprint: Footprint | None = None  # None when the whole bounding box is valid
+
+
+def read_footprint(src: rasterio.DatasetReader, bounds: tuple[float, float, float, float]) -> Footprint | None:
+    """ Reproject the dataset mask, read from the lowest overview, on a coarse EPSG:4326 grid. """
+    scale = max(src.width, src.height) / (FOOTPRINT_SIZE * 4)
+    if scale > 1:
+        mask_shape = (max(int(src.height / scale), 1), max(int(src.width / scale), 1))
+    else:
+        mask_shape = (src.height, src.width)
+    mask = src.dataset_mask(out_shape=mask_shape)
+    mask_transform = src.transform * src.transform.scale(src.width / mask_shape[1], src.height / mask_shape[0])
+
+    minx, miny, maxx, maxy = bounds
+    aspect = (maxx - minx) / (maxy - miny) if maxy > miny else 1
+    width = max(int(FOOTPRINT_SIZE * min(aspect, 1)), 1)
+    height = max(int(FOOTPRINT_SIZE / max(aspect, 1)), 1)
+
+    grid = np.zeros((height, width), dtype=np.uint8)
+    reproject(
+        mask, grid,
+        src_transform=mask_transform, src_crs=src.crs,
+        dst_transform=rasterio.transform.from_bounds(minx, miny, maxx, maxy, width, height), dst_crs="EPSG:4326",
+        resampling=Resampling.max,
+    )
+
+    # Grow by one cell to stay on the safe side of the coarse resampling.
+    valid = grid > 0
+    grown = valid.copy()
+    grown[1:, :] |= valid[:-1, :]
+    grown[:-1, :] |= valid[1:, :]
+    grown[:, 1:] |= valid[:, :-1]
+    grown[:, :-1] |= valid[:, 1:]
+
+    if grown.all():
+        return None
+    return Footprint(width=width, height=height, bits=base64.b64encode(np.packbits(grown)).decode("ascii"))
+
+
+def read_cog_info(path: Path, st: os.stat_result) -> CogInfo:
+    """ Open the raster once and extract everything the index needs. """
+    with rasterio.open(path) as src:
+        bounds = tuple(transform_bounds(src.crs, "EPSG:4326", *src.bounds))
+        try:
+            footprint = read_footprint(src, bounds)
+        except (rasterio.errors.RasterioError, ValueError) as e:
+            logger.warning(f"Cannot compute the footprint of {path}, using its bounds: {e}")
+            footprint = None
+
+        return CogInfo(
+            name=path.name,
+            bounds=bounds,
+            crs=src.crs.to_string(),
+            count=src.count,
+            dtype=src.dtypes[0],
+            width=src.width,
+            height=src.height,
+            res=tuple(src.res),
+            overviews=src.overviews(1),
+            mtime_ns=st.st_mtime_ns,
+            size=st.st_size,
+            footprint=footprint,
+        )
+
+
+def get_zoom_range(infos: list[CogInfo]) -> tuple[int, int]:
+    """ Web mercator zoom levels from the coarsest overview to the native resolution of the COG. """
+    tms = morecantile.tms.get("WebMercatorQuad")
+    minzoom, maxzoom = 24, 0
+    for info in infos:
+        # Web mercator pixels shrink on the ground by cos(latitude).
+        stretch = 1 / math.cos(math.radians((info.bounds[1] + info.bounds[3]) / 2))
+        res = min(info.res)
+        if CRS.from_string(info.crs).is_geographic:
+            res *= 111320 / stretch
+
+        maxzoom = max(maxzoom, tms.zoom_for_res(res * stretch))
+        minzoom = min(minzoom, tms.zoom_for_res(res * stretch * max(info.overviews, default=1)))
+    return min(minzoom, maxzoom), maxzoom
+
+
+class CogIndexStore:
+    """ Manifest of raster metadata per data folder, persisted as json so workers don't reopen every COG. """
+
+    def __init__(self, index_path: Path) -> None:
+        self.index_path = index_path
+        self._manifests: dict[Path, dict[str, CogInfo]] = {}
+        self._lock = threading.Lock()
+
+
+    def manifest_path(self, folder: Path) -> Path:
+        """ One manifest by collection/year folder. """
+        return Path(self.index_path, folder.parent.name, f"{folder.name}.json")
+
+
+    def load(self, list_rasters: list[Path]) -> dict[Path, CogInfo]:
+        """ Return the metadata of each raster, only opening those added or modified since the last run. """
+        rasters_by_folder: dict[Path, list[Path]] = {}
+        for path in list_rasters:
+            rasters_by_folder.setdefault(path.parent, []).append(path)
+
+        cog_infos = {}
+        for folder, paths in rasters_by_folder.items():
+            with self._lock:
+                manifest = self._load_folder(folder, paths)
+            for path in paths:
+                cog_infos[path] = manifest[path.name]
+
+        return cog_infos
+
+
+    def peek(self, folder: Path) -> list[CogInfo]:
+        """ Metadata last recorded for a folder, without opening any raster. May be outdated, empty if never indexed. """
+        with self._lock:
+            manifest = self._manifests.get(folder)
+            if manifest is None:
+                manifest = self._read_manifest(folder)
+        return list(manifest.values())
+
+
+    def _load_folder(self, folder: Path, paths: list[Path]) -> dict[str, CogInfo]:
+        manifest = self._manifests.get(folder)
+        if manifest is None:
+            manifest = self._read_manifest(folder)
+
+        updated = False
+        for path in paths:
+            st = os.stat(path)
+            info = manifest.get(path.name)
+            if info is not None and info.mtime_ns == st.st_mtime_ns and info.size == st.st_size:
+                continue
+
+            manifest[path.name] = read_cog_info(path, st)
+            updated = True
+
+        # Forget rasters removed from the folder.
+        for name in [name for name in manifest if not Path(folder, name).exists()]:
+            del manifest[name]
+            updated = True
+
+        if updated:
+            self._write_manifest(folder, manifest)
+
+        self._manifests[folder] = manifest
+        return manifest
+
+
+    def _read_manifest(self, folder: Path) -> dict[str, CogInfo]:
+        manifest_path = self.manifest_path(folder)
+        if not manifest_path.exists():
+            return {}
+
+        try:
+            with open(manifest_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot read index manifest {manifest_path}, rebuilding it: {e}")
+            return {}
+
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+
+        manifest = {}
+        for entry in data.get("rasters", []):
+            entry["bounds"] = tuple(entry["bounds"])
+            entry["res"] = tuple(entry["res"])
+            if entry.get("footprint") is not None:
+                entry["footprint"] = Footprint(**entry["footprint"])
+            manifest[entry["name"]] = CogInfo(**entry)
+        return manifest
+
+
+    def _write_manifest(self, folder: Path, manifest: dict[str, CogInfo]) -> None:
+        """ Write to a temporary file then rename, so other workers never read a partial manifest. """
+        manifest_path = self.manifest_path(folder)
+        try:
+            manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "version": MANIFEST_VERSION,
+                    "folder": str(folder),
+                    "rasters": [asdict(info) for info in sorted(manifest.values(), key=lambda i: i.name)]
+                }, f)
+            os.replace(tmp_path, manifest_path)
+        except OSError as e:
+            logger.warning(f"Cannot write index manifest {manifest_path}: {e}")
+
+
+cog_index_store = CogIndexStore(Path(settings.CACHE_PATH, "index"))
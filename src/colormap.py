@@ -0,0 +1,74 @@
+import functools
+import numpy as np
+from pathlib import Path
+
+# Number of entries of the lookup table of continuous ramps.
+CONTINUOUS_LUT_SIZE = 1024
+
+# Values of color.txt files used for nodata by gdaldem.
+NODATA_ENTRIES = ("nan", "nv", "-9999")
+
+
+def read_color_file(color_path: Path) -> list[tuple[float, tuple[int, int, int, int]]]:
+    """ Read a gdaldem color-relief file, sorted by value. """
+    entries = []
+    with open(color_path, "r") as file:
+        for row in file:
+            row_split = [b for b in row.replace("\n", "").split(" ") if b != ""]
+            if len(row_split) != 5 or row_split[0].lower() in NODATA_ENTRIES: continue
+            value, r, g, b, a = row_split
+            entries.append((float(value), (int(r), int(g), int(b), int(a))))
+
+    return sorted(entries)
+
+
+class ColorMap:
+    """ Color ramp of a color.txt file compiled into a lookup table. """
+
+    def __init__(self, color_path: Path, categorical: bool) -> None:
+        self.entries = read_color_file(color_path)
+        self.categorical = categorical
+
+        values = np.array([value for value, _ in self.entries])
+        colors = np.array([color for _, color in self.entries], dtype=np.float64)
+        self.vmin, self.vmax = float(values[0]), float(values[-1])
+
+        # Distinct visible colors of the classes, the palette of categorical PNG tiles.
+        self.palette = tuple(dict.fromkeys(color for _, color in self.entries if color[3] > 0)) if categorical else ()
+
+        if categorical:
+            # One entry by class value, classes not in the file are transparent.
+            self.lut = np.zeros((256, 4), dtype=np.uint8)
+            for value, color in self.entries:
+                if 0 <= value < 256 and value == int(value):
+                    self.lut[int(value)] = color
+        else:
+            # Linear interpolation between entries, like gdaldem, values outside of the ramp take the closest color.
+            samples = np.linspace(self.vmin, self.vmax, CONTINUOUS_LUT_SIZE)
+            self.lut = np.stack([np.interp(samples, values, colors[:, c]) for c in range(4)], axis=1).round().astype(np.uint8)
+
+
+    def apply(self, data: np.ndarray, valid: np.ndarray, value_range: tuple[float, float] | None = None, hidden: tuple[int, ...] = ()) -> np.ndarray:
+        """ Return the RGBA array of a single band, transparent where valid is False. """
+        if self.categorical:
+            classes = np.clip(np.nan_to_num(data, nan=0), 0, 255).astype(np.uint8)
+            lut = self.lut
+            if len(hidden) > 0:
+                lut = lut.copy()
+                lut[[h for h in hidden if 0 <= h < 256], 3] = 0
+            rgba = lut[classes]
+        else:
+            vmin, vmax = value_range if value_range != None else (self.vmin, self.vmax)
+            # Stretch the ramp on the requested range then index the table.
+            position = (data.astype(np.float32) - vmin) / (vmax - vmin)
+            index = np.clip(np.nan_to_num(position * (CONTINUOUS_LUT_SIZE - 1), nan=0), 0, CONTINUOUS_LUT_SIZE - 1)
+            rgba = self.lut[index.astype(np.int32)]
+
+        rgba = np.moveaxis(rgba, -1, 0)
+        rgba[3][~valid] = 0
+        return rgba
+
+
+@functools.lru_cache()
+def load_colormap(color_path: Path, categorical: bool) -> ColorMap:
+    return ColorMap(color_path, categorical)
@@ -0,0 +1,82 @@
+import logging
+import threading
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from rio_tiler.models import ImageData
+
+from .encoding import encode_tile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Shared memory blocks attached by an encoding process, by name. They are reused by the next tiles.
+_attached: dict[str, shared_memory.SharedMemory] = {}
+
+
+def _encode_shared(name: str, shape: tuple[int, ...], dtype: str, img_format: str, palette: tuple) -> bytes:
+    """ Run in an encoding process: encode the array written by the render thread in a shared memory block. """
+    shm = _attached.get(name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = shm
+
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    return encode_tile(ImageData(array), img_format, palette)
+
+
+class EncodePool:
+    """
+    Encode tiles in a pool of processes so the PNG, WebP and JPEG encoders of one worker use every core.
+    The merged array goes through a shared memory block, only the encoded bytes are pickled back.
+    """
+
+    def __init__(self, processes: int) -> None:
+        self.processes = processes
+
+        # Forking a worker running GDAL and thread pools is unsafe, the processes start from a clean server.
+        self._pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("forkserver"))
+
+        # Free blocks by size in bytes. There are never more blocks than tiles encoded at the same time.
+        self._free: dict[int, list[shared_memory.SharedMemory]] = {}
+        self._blocks: list[shared_memory.SharedMemory] = []
+        self._lock = threading.Lock()
+
+
+    def _acquire(self, size: int) -> shared_memory.SharedMemory:
+        with self._lock:
+            free = self._free.setdefault(size, [])
+            if len(free) > 0:
+                return free.pop()
+
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        with self._lock:
+            self._blocks.append(shm)
+        return shm
+
+
+    def _release(self, shm: shared_memory.SharedMemory, size: int) -> None:
+        with self._lock:
+            self._free[size].append(shm)
+
+
+    def encode(self, tile: ImageData, img_format: str, palette: tuple = ()) -> bytes:
+        """ Same output as encode_tile, blocking until an encoding process is done. """
+        data = tile.data
+        shm = self._acquire(data.nbytes)
+        try:
+            np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[...] = data
+            return self._pool.submit(_encode_shared, shm.name, data.shape, data.dtype.str, img_format, palette).result()
+        finally:
+            self._release(shm, data.nbytes)
+
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            for shm in self._blocks:
+                shm.close()
+                shm.unlink()
+            self._blocks.clear()
+            self._free.clear()
@@ -0,0 +1,98 @@
+import io
+import functools
+import numpy as np
+from PIL import Image
+from rio_tiler.models import ImageData
+from rio_tiler.profiles import img_profiles
+
+# Tile formats served, by URL extension.
+MEDIA_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "jpg": "image/jpeg",
+}
+
+
+def negotiate_format(extension: str, accept: str | None, prefer_lossy: bool) -> str:
+    """ The URL extension wins, a png request of a photographic layer is upgraded to webp when the client accepts it. """
+    extension = "jpg" if extension == "jpeg" else extension
+    if extension != "png":
+        return extension
+
+    if prefer_lossy and accept != None and "image/webp" in accept:
+        return "webp"
+
+    return "png"
+
+
+# Bits kept by channel to look up the palette color of a pixel.
+PALETTE_BITS = 5
+
+# A tile color, (r, g, b, a).
+Color = tuple[int, int, int, int]
+
+
+def palette_cell(r: np.ndarray | int, g: np.ndarray | int, b: np.ndarray | int) -> np.ndarray | int:
+    """ Index of the RGB cell of PALETTE_BITS bits by channel holding a color. """
+    shift = 8 - PALETTE_BITS
+    return (np.uint16(r) >> shift) << (2 * PALETTE_BITS) | (np.uint16(g) >> shift) << PALETTE_BITS | (np.uint16(b) >> shift)
+
+
+@functools.lru_cache()
+def palette_lookup(colors: tuple[Color, ...]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the palette of a categorical layer, transparent first, and the palette index of each RGB cell: the closest color to its center.
+    The cell of each palette color maps to it, so the tiles colored through the color.txt keep their exact colors.
+    """
+    palette = np.array([(0, 0, 0, 0), *colors], dtype=np.uint8)
+
+    step = 1 << (8 - PALETTE_BITS)
+    centers = np.arange(1 << PALETTE_BITS, dtype=np.int32) * step + step // 2
+    cells = np.stack(np.meshgrid(centers, centers, centers, indexing="ij"), axis=-1).reshape(-1, 1, 3)
+    distances = ((cells - palette[1:, :3].astype(np.int32)) ** 2).sum(axis=-1)
+    lookup = (distances.argmin(axis=-1) + 1).astype(np.uint8)
+
+    for index, (r, g, b, _) in enumerate(colors):
+        lookup[palette_cell(r, g, b)] = index + 1
+    return palette, lookup
+
+
+def encode_palette_png(rgba: np.ndarray, colors: tuple[Color, ...]) -> bytes:
+    """ Encode an RGBA array as an 8-bit palette PNG of the colors of a color.txt, each pixel takes the closest one. """
+    palette, lookup = palette_lookup(colors)
+    indices = lookup[palette_cell(rgba[0], rgba[1], rgba[2])]
+    indices[rgba[3] == 0] = 0
+
+    img = Image.fromarray(indices, mode="P")
+    img.putpalette(palette[:, :3].tobytes(), rawmode="RGB")
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG", transparency=palette[:, 3].tobytes(), compress_level=img_profiles.get("png")["zlevel"])
+    return buffer.getvalue()
+
+
+def encode_tile(tile: ImageData, img_format: str, palette: tuple[Color, ...] = ()) -> bytes:
+    """ Encode an RGBA tile. Categorical layers give the colors of their classes and use a palette PNG. """
+    if img_format == "png":
+        if 0 < len(palette) < 256:
+            return encode_palette_png(tile.data, palette)
+        return tile.render(img_format="PNG", add_mask=False, **img_profiles.get("png"))
+
+    if img_format == "webp":
+        return tile.render(img_format="WEBP", add_mask=False, **img_profiles.get("webp"))
+
+    if img_format == "jpg":
+        # No alpha in JPEG, transparent pixels are black.
+        rgb = ImageData(tile.data[:3], crs=tile.crs, bounds=tile.bounds)
+        return rgb.render(img_format="JPEG", add_mask=False, **img_profiles.get("jpeg"))
+
+    raise ValueError(f"Unknown tile format {img_format}")
+
+
+@functools.lru_cache()
+def empty_tile(img_format: str, tilesize: int = 256) -> bytes:
+    """ Fully transparent tile of a format, encoded once. """
+    img = Image.new("RGBA" if img_format != "jpg" else "RGB", (tilesize, tilesize))
+    buffer = io.BytesIO()
+    img.save(buffer, format={"png": "PNG", "webp": "WEBP", "jpg": "JPEG"}[img_format])
+    return buffer.getvalue()
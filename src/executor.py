@@ -0,0 +1,49 @@
+import asyncio
+import logging
+import functools
+from typing import Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class RenderQueueFull(Exception):
+    """ Raised when too many renders are already in flight. """
+    pass
+
+
+class RenderExecutor:
+    """ Bounded thread pool used to run blocking GDAL reads and encoding outside of the event loop. """
+
+    def __init__(self, max_workers: int, max_inflight: int, queue_timeout: float) -> None:
+        self.max_workers = max_workers
+        self.max_inflight = max_inflight
+        self.queue_timeout = queue_timeout
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="render")
+        self._slots = asyncio.Semaphore(max_inflight)
+
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """ Run func in the pool, waiting at most queue_timeout for a free slot. """
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise RenderQueueFull(f"More than {self.max_inflight} renders in flight")
+
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._pool.submit(functools.partial(func, *args, **kwargs))
+        except Exception:
+            self._slots.release()
+            raise
+
+        # Release the slot when the thread is done, not when the client goes away.
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._slots.release))
+
+        return await asyncio.wrap_future(future)
+
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
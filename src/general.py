@@ -1,15 +1,25 @@
+import logging
+import numpy as np
 from pathlib import Path
 from rio_tiler.models import ImageData
 
-from .base import ParametersCOG
+from . import settings
+from .base import BaseManager, ParametersCOG, DataChange
+from .archive import ArchiveStore, MBTilesArchive
+from .registry import LazyRegistry
+from .colormap import load_colormap
+from .tile_cache import source_fingerprint
 from .bathy import BathyManager
 from .ortho import OrthoManager
-from .pred_ign import PredIGNManager
-from .pred_drone import PredDroneManager
+from .pred_ign import PredIGNManager, PredIGNCogYear
+from .pred_drone import PredDroneManager, PredDroneCogYear
 from .pred_asv import PredASVManager
 
 from enum import Enum
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 class ManagerType(Enum):
     BATHY = "bathy"
     PRED_DRONE = "pred_drone"
@@ -44,16 +54,161 @@ class ManagerType(Enum):
 
         return "Not found"
 
+    def is_categorical(type: str) -> bool:
+        """ Layers made of a few classes. """
+        return type in [ManagerType.PRED_IGN.value, ManagerType.PRED_DRONE.value, ManagerType.PRED_ASV.value]
+
+    def get_palette(type: str) -> tuple[tuple[int, int, int, int], ...]:
+        """ Colors of the classes of a categorical layer from its color.txt, empty if it has none. """
+        if type == ManagerType.PRED_IGN.value: return load_colormap(PredIGNCogYear.colormap_path, True).palette
+        if type == ManagerType.PRED_DRONE.value: return load_colormap(PredDroneCogYear.colormap_path, True).palette
+        return ()
+
+    def prefer_lossy(type: str) -> bool:
+        """ Photographic layers, served as lossy webp to clients accepting it. """
+        return type in [ManagerType.ORTHO.value, ManagerType.IGN.value]
+
 class GeneralManager:
 
     def __init__(self, data_path: Path) -> None:
         
+        self.data_path = data_path
         self.bathy_manager = BathyManager(Path(data_path, ManagerType.BATHY.value))
         self.ortho_manager = OrthoManager(Path(data_path, ManagerType.ORTHO.value))
         self.pred_ign_manager = PredIGNManager(Path(data_path, ManagerType.PRED_IGN.value))
         self.pred_drone_manager = PredDroneManager(Path(data_path, ManagerType.PRED_DRONE.value))
         self.pred_asv_manager = PredASVManager(Path(data_path, ManagerType.PRED_ASV.value))
         self.ign_manager = OrthoManager(Path(data_path, ManagerType.IGN.value))
+        self.archive_store = ArchiveStore(Path(settings.ARCHIVE_PATH))
+
+
+    def reload(self) -> dict[str, dict[str, DataChange]]:
+        """ Rebuild the indexes of the years changed on disk, return the changes by collection and year. """
+        changes = {
+            ManagerType.BATHY.value: self.bathy_manager.reload(),
+            ManagerType.ORTHO.value: self.ortho_manager.reload(),
+            ManagerType.PRED_IGN.value: self.pred_ign_manager.reload(),
+            ManagerType.PRED_DRONE.value: self.pred_drone_manager.reload(),
+            ManagerType.PRED_ASV.value: self.pred_asv_manager.reload(),
+            ManagerType.IGN.value: self.ign_manager.reload(),
+        }
+        return {collection: by_year for collection, by_year in changes.items() if len(by_year) > 0}
+
+
+    def get_registries(self) -> dict[str, LazyRegistry]:
+        return {
+            ManagerType.BATHY.value: self.bathy_manager.bathy_cog_by_year,
+            ManagerType.ORTHO.value: self.ortho_manager.ortho_cog_by_year,
+            ManagerType.PRED_IGN.value: self.pred_ign_manager.pred_cog_by_year,
+            ManagerType.PRED_DRONE.value: self.pred_drone_manager.pred_cog_by_year,
+            ManagerType.PRED_ASV.value: self.pred_asv_manager.pred_cog_by_year,
+            ManagerType.IGN.value: self.ign_manager.ortho_cog_by_year,
+        }
+
+
+    def warm_up(self) -> None:
+        """ Index every year (and every specie of ASV predictions) ahead of the first requests. """
+        for collection_name, registry in self.get_registries().items():
+            registry.warm_up()
+            if collection_name == ManagerType.PRED_ASV.value:
+                for pred_year_manager in registry.loaded().values():
+                    pred_year_manager.pred_cog_by_specie.warm_up()
+            logger.info(f"{collection_name} ready")
+
+
+    def status(self) -> dict[str, dict]:
+        """ Years indexed so far by collection. """
+        return {collection_name: registry.status() for collection_name, registry in self.get_registries().items()}
+
+
+    def get_year_manager(self, collection_type: str, year: str, specie: str | None = None) -> BaseManager | None:
+        """ Return the manager holding the index of a collection year (and specie for ASV predictions). """
+
+        if collection_type == ManagerType.BATHY.value:
+            return self.bathy_manager.bathy_cog_by_year.get(year, None)
+        elif collection_type == ManagerType.ORTHO.value:
+            return self.ortho_manager.ortho_cog_by_year.get(year, None)
+        elif collection_type == ManagerType.PRED_DRONE.value:
+            return self.pred_drone_manager.pred_cog_by_year.get(year, None)
+        elif collection_type == ManagerType.PRED_IGN.value:
+            return self.pred_ign_manager.pred_cog_by_year.get(year, None)
+        elif collection_type == ManagerType.IGN.value:
+            return self.ign_manager.ortho_cog_by_year.get(year, None)
+        elif collection_type == ManagerType.PRED_ASV.value and specie != None:
+            pred_year_manager = self.pred_asv_manager.pred_cog_by_year.get(year, None)
+            if pred_year_manager != None:
+                return pred_year_manager.pred_cog_by_specie.get(specie, None)
+        return None
+
+
+    def get_archive(self, collection_type: str, year: str, specie: str | None, params: ParametersCOG) -> MBTilesArchive | None:
+        """ Return the archive able to answer the tile, None to render it from the COG. """
+        archive = self.archive_store.get(collection_type, year, specie)
+        if archive == None or params.render != "color" or params.tilesize != 256 or not archive.covers(params.z, params.with_asv, params.img_format):
+            return None
+        return archive
+
+
+    def is_loaded(self, collection_type: str, year: str, specie: str | None) -> bool:
+        """ True when the year (and specie) is already indexed, so get_year_manager does not block. """
+        registry = self.get_registries().get(collection_type, None)
+        if registry == None:
+            return True
+
+        year_manager = registry.peek(year)
+        if collection_type == ManagerType.PRED_ASV.value and year_manager != None and specie != None:
+            return year_manager.pred_cog_by_specie.peek(specie) != None
+        return year_manager != None or year not in registry
+
+
+    def get_loaded_year(self, collection_type: str, year: str):
+        """ Manager of a year folder (all species for ASV predictions) if already indexed, None otherwise. Never blocks. """
+        registry = self.get_registries().get(collection_type, None)
+        return registry.peek(year) if registry != None else None
+
+
+    def is_archived(self, collection_type: str, year: str, specie: str | None) -> bool:
+        """ Years exported to an archive are frozen. """
+        return self.archive_store.get(collection_type, year, specie) != None
+
+
+    def is_outside(self, collection_type: str, year: str, specie: str | None, params: ParametersCOG) -> bool:
+        """ True when the tile is known to be empty from the index alone. Never loads a year, so it can run on the event loop. """
+        registry = self.get_registries().get(collection_type, None)
+        if registry == None or year not in registry:
+            return True
+
+        year_manager = registry.peek(year)
+        if collection_type != ManagerType.PRED_ASV.value and specie != None:
+            return True
+        if collection_type == ManagerType.PRED_ASV.value:
+            if specie == None:
+                return True
+            if year_manager == None:
+                return False
+            if specie not in year_manager.pred_cog_by_specie:
+                return True
+            year_manager = year_manager.pred_cog_by_specie.peek(specie)
+
+        # Not indexed yet, the render will tell.
+        if year_manager == None:
+            return False
+
+        return year_manager.coverage.excludes(params.z, params.bb, settings.MAX_OVERZOOM)
+
+
+    def get_tile_sources(self, collection_type: str, year: str, specie: str | None, params: ParametersCOG) -> list[Path]:
+        """ Return the COG used to render a tile, empty if the collection or year is unknown. """
+        year_manager = self.get_year_manager(collection_type, year, specie)
+        if year_manager == None:
+            return []
+        return year_manager.get_tile_sources(params)
+
+
+    def get_source_fingerprint(self, collection_type: str, year: str, specie: str | None, sources: list[Path]) -> str:
+        """ Fingerprint of the COG of a tile from the index of the year, the files are not touched. """
+        year_manager = self.get_year_manager(collection_type, year, specie)
+        return source_fingerprint(sources, year_manager.cog_infos if year_manager != None else {})
 
 
     def get_tile(self, collection_type: str, year: str, params: ParametersCOG) -> ImageData | None:
@@ -90,4 +245,15 @@ class GeneralManager:
 
     def get_prediction_ign(self, lon: float, lat: float, year: str) -> str | None:
         return self.pred_ign_manager.get_prediction(lon, lat, year)
-        
\ No newline at end of file
+
+
+    def get_depths(self, lons: np.ndarray, lats: np.ndarray, year: str) -> list[float | None]:
+        return self.bathy_manager.get_depths(lons, lats, year)
+
+
+    def get_predictions_drone(self, lons: np.ndarray, lats: np.ndarray, year: str) -> list[str | None]:
+        return self.pred_drone_manager.get_predictions(lons, lats, year)
+
+
+    def get_predictions_ign(self, lons: np.ndarray, lats: np.ndarray, year: str) -> list[str | None]:
+        return self.pred_ign_manager.get_predictions(lons, lats, year)
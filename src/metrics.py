@@ -0,0 +1,147 @@
+import os
+import bisect
+import threading
+
+from .base import TileStats
+from .general import ManagerType
+from .tile_cache import TMS
+
+# Upper bounds of the latency buckets, in seconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the buckets counting COG read for one tile.
+SOURCES_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+# Collections exported as label, any other path segment is counted as unknown so clients cannot add series.
+KNOWN_COLLECTIONS = {manager_type.value for manager_type in ManagerType}
+
+
+def escape_label(value: str) -> str:
+    """ Escape a label value as the Prometheus text format expects. """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    return ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items())
+
+
+def tile_labels(worker: str, collection_name: str, z: int) -> dict[str, str]:
+    """ Labels of a tile request, bounded to the known collections and the zoom levels of the tile matrix set. """
+    collection = collection_name if collection_name in KNOWN_COLLECTIONS else "unknown"
+    zoom = min(max(z, TMS.minzoom), TMS.maxzoom)
+    return {"worker": worker, "collection": collection, "zoom": str(zoom)}
+
+
+class Histogram:
+    """ Prometheus histogram with one series by label set. """
+
+    def __init__(self, name: str, description: str, buckets: tuple) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts, sum, count]
+
+
+    def observe(self, labels: dict[str, str], value: float) -> None:
+        key = tuple(labels.items())
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, (bucket_counts, total, count) in sorted(self._series.items()):
+            labels = format_labels(dict(key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    """ Prometheus counter with one series by label set. """
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self._series: dict[tuple, float] = {}
+
+
+    def inc(self, labels: dict[str, str], value: float = 1) -> None:
+        key = tuple(labels.items())
+        self._series[key] = self._series.get(key, 0) + value
+
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{{{format_labels(dict(key))}}} {value}")
+        return lines
+
+
+class TileMetrics:
+    """ Aggregate the stats of each tile request, by collection and zoom level. """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.worker = str(os.getpid())
+
+        self.duration = Histogram("cog_server_tile_duration_seconds", "Time to answer a tile request.", LATENCY_BUCKETS)
+        self.stage_duration = Histogram("cog_server_tile_stage_duration_seconds", "Time spent in each stage of the tile pipeline.", LATENCY_BUCKETS)
+        self.sources_read = Histogram("cog_server_tile_sources_read", "COG read to build a tile.", SOURCES_BUCKETS)
+        self.sources_skipped = Counter("cog_server_tile_sources_skipped_total", "COG intersecting a tile but not read.")
+        self.sources_masked = Counter("cog_server_tile_sources_masked_total", "COG reads avoided because the tile misses their valid-data footprint.")
+        self.bytes_read = Counter("cog_server_tile_bytes_read_total", "Decoded pixel bytes read from COG.")
+        self.cache = Counter("cog_server_tile_cache_total", "Tile cache lookups by result.")
+        self.errors = Counter("cog_server_tile_errors_total", "Tile requests that failed.")
+
+
+    def observe_tile(self, collection_name: str, z: int, stats: TileStats, duration_ms: float) -> None:
+        labels = tile_labels(self.worker, collection_name, z)
+        with self._lock:
+            self.duration.observe(labels, duration_ms / 1000)
+            for stage, stage_ms in stats.timings.items():
+                self.stage_duration.observe({**labels, "stage": stage}, stage_ms / 1000)
+            self.sources_read.observe(labels, stats.read)
+            self.sources_skipped.inc(labels, stats.skipped)
+            self.sources_masked.inc(labels, stats.masked)
+            self.bytes_read.inc(labels, stats.bytes_read)
+            self.cache.inc({**labels, "result": stats.cache})
+
+
+    def observe_coalesced(self, collection_name: str, z: int, duration_ms: float) -> None:
+        """ A request served by the render of an identical request: its latency only, the reads are counted once by the leader. """
+        labels = tile_labels(self.worker, collection_name, z)
+        with self._lock:
+            self.duration.observe(labels, duration_ms / 1000)
+            self.cache.inc({**labels, "result": "coalesced"})
+
+
+    def observe_error(self, collection_name: str, z: int) -> None:
+        with self._lock:
+            self.errors.inc(tile_labels(self.worker, collection_name, z))
+
+
+    def render(self, gauges: dict[str, float] | None = None) -> str:
+        """ Prometheus text format. Each uvicorn worker exports its own series, labelled by pid. """
+        with self._lock:
+            lines = []
+            for metric in (self.duration, self.stage_duration, self.sources_read, self.sources_skipped, self.sources_masked, self.bytes_read, self.cache, self.errors):
+                lines += metric.render()
+
+        for name, value in (gauges or {}).items():
+            lines += [f"# TYPE {name} gauge", f'{name}{{worker="{self.worker}"}} {value}']
+
+        return "\n".join(lines) + "\n"
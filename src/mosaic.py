@@ -0,0 +1,122 @@
+import numpy as np
+from abc import ABC, abstractmethod
+
+
+class MosaicMethod(ABC):
+    """ Accumulate RGBA source arrays into a preallocated output buffer. """
+
+    # A source whose pixels are all filled cannot change the output and does not need to be read.
+    skip_filled = False
+
+    def __init__(self) -> None:
+        self.output: np.ndarray | None = None
+        self._mask: np.ndarray | None = None
+
+
+    def _allocate(self, data: np.ndarray) -> None:
+        self.output = np.zeros(data.shape, dtype=data.dtype)
+        self._mask = np.empty(data.shape[1:], dtype=bool)
+
+
+    @property
+    def started(self) -> bool:
+        return self.output is not None
+
+
+    def feed(self, data: np.ndarray) -> None:
+        """ Add the next source, in merge order. """
+        if self.output is None:
+            self._allocate(data)
+        self._feed(data)
+
+
+    @abstractmethod
+    def _feed(self, data: np.ndarray) -> None:
+        pass
+
+
+    def is_done(self) -> bool:
+        """ True when no other source can change the output. """
+        return False
+
+
+    def is_filled(self, window: tuple[slice, slice]) -> bool:
+        """ True when every pixel of the window is final. """
+        return False
+
+
+    def result(self) -> np.ndarray:
+        return self.output
+
+
+class FirstMethod(MosaicMethod):
+    """ A pixel takes the value of the first source that is not transparent. """
+
+    skip_filled = True
+
+    def _allocate(self, data: np.ndarray) -> None:
+        super()._allocate(data)
+        self._empty = np.ones(data.shape[1:], dtype=bool)
+
+
+    def _feed(self, data: np.ndarray) -> None:
+        # Pixels opaque in this source and still empty in the output.
+        np.not_equal(data[3], 0, out=self._mask)
+        np.logical_and(self._mask, self._empty, out=self._mask)
+
+        np.copyto(self.output, data, where=self._mask)
+        np.logical_xor(self._empty, self._mask, out=self._empty)
+
+
+    def is_done(self) -> bool:
+        return not self._empty.any()
+
+
+    def is_filled(self, window: tuple[slice, slice]) -> bool:
+        return not self._empty[window].any()
+
+
+class LastMethod(MosaicMethod):
+    """ A pixel takes the value of the last source that is not transparent. """
+
+    def _feed(self, data: np.ndarray) -> None:
+        np.not_equal(data[3], 0, out=self._mask)
+        np.copyto(self.output, data, where=self._mask)
+
+
+class HighestAlphaMethod(MosaicMethod):
+    """ A pixel takes the value of the most opaque source, the first one on equality. """
+
+    def _feed(self, data: np.ndarray) -> None:
+        np.greater(data[3], self.output[3], out=self._mask)
+        np.copyto(self.output, data, where=self._mask)
+
+
+class MeanMethod(MosaicMethod):
+    """ A pixel takes the mean of the sources that are not transparent. """
+
+    def _allocate(self, data: np.ndarray) -> None:
+        super()._allocate(data)
+        self._sum = np.zeros(data.shape, dtype=np.float32)
+        self._count = np.zeros(data.shape[1:], dtype=np.uint16)
+
+
+    def _feed(self, data: np.ndarray) -> None:
+        np.not_equal(data[3], 0, out=self._mask)
+        np.add(self._sum, data, out=self._sum, where=self._mask)
+        np.add(self._count, 1, out=self._count, where=self._mask)
+
+
+    def result(self) -> np.ndarray:
+        valid = self._count != 0
+        np.divide(self._sum, self._count, out=self._sum, where=valid)
+        np.copyto(self.output, self._sum, where=valid, casting="unsafe")
+        return self.output
+
+
+MOSAIC_METHODS = {
+    "first": FirstMethod,
+    "last": LastMethod,
+    "highest_alpha": HighestAlphaMethod,
+    "mean": MeanMethod,
+}
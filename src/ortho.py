@@ -5,7 +5,8 @@ from rio_tiler.io import COGReader
 from rio_tiler.models import ImageData
 from morecantile.commons import BoundingBox
 
-from .base import BaseManager, ParametersCOG
+from .registry import LazyRegistry
+from .base import BaseManager, ParametersCOG, DataChange, folder_signature, load_years, reload_years
 
 
 logging.basicConfig(level=logging.INFO)
@@ -13,10 +14,13 @@ logger = logging.getLogger(__name__)
 
 class OrthoCogYear(BaseManager):
 
+    filters_asv = True
+
     def __init__(self, ortho_cogs_path: Path) -> None:
         super().__init__()
 
         self.ortho_cogs_path = ortho_cogs_path
+        self.folder_signature = folder_signature(ortho_cogs_path)
         self.list_ortho_cogs = self.get_ortho_files()
         
         self._spindex = self.create_index(self.list_ortho_cogs)
@@ -34,30 +38,17 @@ class OrthoCogYear(BaseManager):
         return [file for file in self.ortho_cogs_path.iterdir() if file.suffix.lower() == ".tif"]
     
 
-    def get_tile(self, p: ParametersCOG) -> ImageData | None:
-        """ Override get tile to sorted ASV before UAV. """
-
+    def get_tile_sources(self, p: ParametersCOG) -> list[Path]:
+        """ Override tile sources to sorted ASV before UAV. """
 
-        list_cogs_intersect = self.spindex.intersect((
+        list_cogs_intersect = self.filter_footprints(self.spindex.intersect((
             p.bb.left, p.bb.bottom, p.bb.right, p.bb.top
-        ))
+        )), p)
 
-        if len(list_cogs_intersect) == 0:
-            return None
-        
         if p.with_asv:
-            list_cogs_intersect = sorted([a for a in list_cogs_intersect if "ASV" in a.name]) + sorted([a for a in list_cogs_intersect if "ASV" not in a.name])
-        else:
-            list_cogs_intersect = sorted([a for a in list_cogs_intersect if "ASV" not in a.name])
-
-        tiles = []
-        for file in list_cogs_intersect:
-            reader = self.reader_cache.get(file)
-            tiles.append(reader.tile(p.x, p.y, p.z, indexes=(1, 2, 3, 4)))
-        
-        tile = tiles[0] if len(tiles) == 1 else self.get_merge_tiles(tiles)
+            return sorted([a for a in list_cogs_intersect if "ASV" in a.name]) + sorted([a for a in list_cogs_intersect if "ASV" not in a.name])
 
-        return tile
+        return sorted([a for a in list_cogs_intersect if "ASV" not in a.name])
 
 
 
@@ -67,14 +58,19 @@ class OrthoManager:
         self.ortho_cog_by_year = self.load_ortho_cog()
 
 
-    def load_ortho_cog(self) -> dict[str, OrthoCogYear]:
+    def load_ortho_cog(self) -> LazyRegistry:
 
         if not self.ortho_data_path.exists():
             raise FileNotFoundError("Cannot access to ortho data, folder not found")
 
-        ortho_cog_by_year = {byp.name:OrthoCogYear(byp) for byp in self.ortho_data_path.iterdir()}
-        
-        return ortho_cog_by_year
+        # Years are indexed on first access.
+        return load_years(self.ortho_data_path, OrthoCogYear)
+
+
+    def reload(self) -> dict[str, DataChange]:
+        """ Rebuild the years whose folder changed since the last load. """
+        self.ortho_cog_by_year, changes = reload_years(self.ortho_cog_by_year, self.ortho_data_path, OrthoCogYear)
+        return changes
     
 
     def get_tile(self, year: str, bb: BoundingBox) -> ImageData | None:
@@ -0,0 +1,209 @@
+import os
+import json
+import fcntl
+import hashlib
+import logging
+import threading
+import numpy as np
+import morecantile
+from pathlib import Path
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+import rasterio
+import rasterio.shutil
+from rasterio.enums import ColorInterp
+from rasterio.windows import Window
+from rasterio.transform import from_bounds
+
+from . import settings
+from .cog_index import CogInfo
+from .tile_cache import source_fingerprint
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OVERVIEW_VERSION = 1
+TILESIZE = 256
+TMS = morecantile.tms.get("WebMercatorQuad")
+
+
+def year_fingerprint(cog_infos: dict[Path, CogInfo]) -> str:
+    """ Hash of the name, mtime and size of every COG of a year, from the index. """
+    h = hashlib.blake2b(digest_size=16)
+    for info in sorted(cog_infos.values(), key=lambda i: i.name):
+        h.update(f"{info.name}:{info.mtime_ns}:{info.size};".encode())
+    return h.hexdigest()
+
+
+class OverviewStore:
+    """
+    Pre-merged EPSG:3857 COG of each collection year, rendered at zoom level min_zoom - 1.
+    Tiles below min_zoom are read from it instead of from every COG they cross.
+    """
+
+    def __init__(self, overview_path: Path, min_zoom: int) -> None:
+        self.overview_path = overview_path
+        self.min_zoom = min_zoom  # 0 disables the overviews
+
+        self._meta: dict[str, tuple[int, dict]] = {}  # key -> (mtime_ns of the metadata file, metadata)
+        self._lock = threading.Lock()
+        self._builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="overview")
+        self._scheduled: set[str] = set()
+
+
+    def get_paths(self, key: str) -> tuple[Path, Path]:
+        return Path(self.overview_path, f"{key}.tif"), Path(self.overview_path, f"{key}.json")
+
+
+    def load_meta(self, key: str) -> dict | None:
+        """ Metadata of the overview, reread when another worker rebuilt it. """
+        tif_path, meta_path = self.get_paths(key)
+        try:
+            mtime_ns = os.stat(meta_path).st_mtime_ns
+        except OSError:
+            return None
+
+        cached = self._meta.get(key)
+        if cached != None and cached[0] == mtime_ns:
+            return cached[1]
+
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot read overview metadata {meta_path}: {e}")
+            return None
+
+        if meta.get("version") != OVERVIEW_VERSION:
+            return None
+
+        self._meta[key] = (mtime_ns, meta)
+        return meta
+
+
+    def get(self, key: str, fingerprint: str) -> Path | None:
+        """ Path of the overview if it was built from the current COG of the year (see year_fingerprint). """
+        meta = self.load_meta(key)
+        if meta == None or meta["fingerprint"] != fingerprint or meta["zoom"] != self.min_zoom - 1:
+            return None
+        return Path(self.overview_path, meta["file"])
+
+
+    def schedule(self, key: str, cog_infos: dict[Path, CogInfo], get_sources: Callable, render: Callable) -> None:
+        """ Build the overview in the background, once at a time for a key. """
+        with self._lock:
+            if key in self._scheduled:
+                return
+            self._scheduled.add(key)
+
+        def run():
+            try:
+                self.build(key, cog_infos, get_sources, render)
+            except Exception:
+                logger.exception(f"Failed to build the overview of {key}")
+            finally:
+                with self._lock:
+                    self._scheduled.discard(key)
+
+        self._builder.submit(run)
+
+
+    def build(self, key: str, cog_infos: dict[Path, CogInfo], get_sources: Callable, render: Callable) -> dict | None:
+        """
+        Render every tile of the year at the overview zoom into a COG. get_sources(tile) returns the COG of a tile
+        and render(tile) its RGBA array. Tiles whose sources did not change are copied from the previous overview.
+        Return the build stats, None when another process holds the lock of the key.
+        """
+        tif_path, meta_path = self.get_paths(key)
+        tif_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(meta_path.with_suffix(".lock"), "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+
+            zoom = self.min_zoom - 1
+            fingerprint = year_fingerprint(cog_infos)
+            old_meta = self.load_meta(key)
+            if old_meta != None and old_meta["fingerprint"] == fingerprint and old_meta["zoom"] == zoom:
+                return {"rendered": 0, "copied": 0, "empty": 0}
+
+            tiles = set()
+            for info in cog_infos.values():
+                tiles.update(TMS.tiles(*info.bounds, zooms=[zoom]))
+            min_x, max_x = min(t.x for t in tiles), max(t.x for t in tiles)
+            min_y, max_y = min(t.y for t in tiles), max(t.y for t in tiles)
+
+            left, _, _, top = TMS.xy_bounds(min_x, min_y, zoom)
+            _, bottom, right, _ = TMS.xy_bounds(max_x, max_y, zoom)
+            width, height = (max_x - min_x + 1) * TILESIZE, (max_y - min_y + 1) * TILESIZE
+
+            old_tif = None
+            if old_meta != None and old_meta["zoom"] == zoom and Path(self.overview_path, old_meta["file"]).exists():
+                old_tif = rasterio.open(Path(self.overview_path, old_meta["file"]))
+
+            profile = dict(
+                driver="GTiff", width=width, height=height, count=4, dtype="uint8", crs="EPSG:3857",
+                transform=from_bounds(left, bottom, right, top, width, height),
+                tiled=True, blockxsize=TILESIZE, blockysize=TILESIZE, compress="deflate", photometric="RGB",
+            )
+            tmp_path = tif_path.with_suffix(f".{os.getpid()}.tmp.tif")
+            fingerprints, stats = {}, {"rendered": 0, "copied": 0, "empty": 0}
+            try:
+                with rasterio.open(tmp_path, "w", **profile) as dst:
+                    dst.colorinterp = [ColorInterp.red, ColorInterp.green, ColorInterp.blue, ColorInterp.alpha]
+
+                    for tile in sorted(tiles, key=lambda t: (t.y, t.x)):
+                        sources = get_sources(tile)
+                        if len(sources) == 0:
+                            stats["empty"] += 1
+                            continue
+
+                        tile_key = f"{tile.x}/{tile.y}"
+                        fingerprints[tile_key] = source_fingerprint(sources, cog_infos)
+                        window = Window((tile.x - min_x) * TILESIZE, (tile.y - min_y) * TILESIZE, TILESIZE, TILESIZE)
+
+                        array = None
+                        if old_tif != None and old_meta["tiles"].get(tile_key) == fingerprints[tile_key]:
+                            old_x, old_y = old_meta["origin"]
+                            array = old_tif.read(window=Window((tile.x - old_x) * TILESIZE, (tile.y - old_y) * TILESIZE, TILESIZE, TILESIZE))
+                            stats["copied"] += 1
+                        else:
+                            array = render(tile)
+                            stats["rendered"] += 1
+
+                        if array is not None:
+                            dst.write(np.asarray(array, dtype=np.uint8), window=window)
+
+                file_name = f"{Path(key).name}.{fingerprint[:8]}.tif"
+                rasterio.shutil.copy(tmp_path, Path(tif_path.parent, file_name), driver="COG", compress="deflate", overview_resampling="average", blocksize=TILESIZE)
+            finally:
+                if old_tif != None:
+                    old_tif.close()
+                tmp_path.unlink(missing_ok=True)
+
+            meta = {
+                "version": OVERVIEW_VERSION,
+                "zoom": zoom,
+                "fingerprint": fingerprint,
+                "file": str(Path(key).parent / file_name),
+                "origin": [min_x, min_y],
+                "tiles": fingerprints,
+            }
+            tmp_meta = meta_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_meta, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, meta_path)
+
+            # The previous file may still be open by readers of other workers, it is removed on the next build.
+            for old_file in tif_path.parent.glob(f"{Path(key).name}.*.tif"):
+                if old_file.name != file_name and (old_meta == None or old_file.name != Path(old_meta["file"]).name):
+                    old_file.unlink(missing_ok=True)
+
+            logger.info(f"Overview of {key} built: {stats}")
+            return stats
+
+
+overview_store = OverviewStore(Path(settings.CACHE_PATH, "overviews"), settings.OVERVIEW_ZOOM)
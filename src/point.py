@@ -0,0 +1,161 @@
+import logging
+import threading
+import numpy as np
+from pathlib import Path
+from dataclasses import dataclass
+from collections import OrderedDict
+
+import rasterio
+from pyproj import Transformer
+from affine import Affine
+from rasterio.windows import Window
+from rasterio.transform import rowcol
+
+from . import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DataReader:
+    dataset: rasterio.DatasetReader
+    lock: threading.Lock        # Held to read the dataset and to close it
+    crs: str
+    transform: Affine           # Geometry copied at opening, still valid once the dataset is closed
+    height: int
+    width: int
+    block_height: int
+    block_width: int
+    nodata: float | None
+    closed: bool = False
+
+
+class PointSampler:
+    """ Sample data rasters at EPSG:4326 points through cached handles, transformers and decoded blocks. """
+
+    def __init__(self, max_datasets: int, max_block_bytes: int) -> None:
+        self.max_datasets = max_datasets
+        self.max_block_bytes = max_block_bytes
+
+        self._readers: OrderedDict[Path, DataReader] = OrderedDict()
+        self._blocks: OrderedDict[tuple[Path, int, int], np.ndarray] = OrderedDict()
+        self._block_bytes = 0
+        self._lock = threading.Lock()
+
+        # pyproj transformers must not be shared between threads.
+        self._local = threading.local()
+
+
+    def _get_reader(self, path: Path) -> DataReader:
+        with self._lock:
+            reader = self._readers.get(path)
+            if reader is not None:
+                self._readers.move_to_end(path)
+                return reader
+
+            dataset = rasterio.open(path)
+            block_height, block_width = dataset.block_shapes[0]
+            reader = DataReader(dataset, threading.Lock(), dataset.crs.to_string(), dataset.transform, dataset.height, dataset.width, block_height, block_width, dataset.nodata)
+            self._readers[path] = reader
+
+            evicted = self._readers.popitem(last=False) if len(self._readers) > self.max_datasets else None
+
+        if evicted is not None:
+            self._close(*evicted)
+
+        return reader
+
+
+    def _close(self, path: Path, reader: DataReader) -> None:
+        with reader.lock:
+            reader.closed = True
+            try:
+                reader.dataset.close()
+            except Exception as e:
+                logger.warning(f"Failed to close dataset for {path}: {e}")
+
+
+    def _get_transformer(self, crs: str) -> Transformer:
+        transformers = getattr(self._local, "transformers", None)
+        if transformers is None:
+            transformers = self._local.transformers = {}
+
+        transformer = transformers.get(crs)
+        if transformer is None:
+            transformer = transformers[crs] = Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+        return transformer
+
+
+    def _get_block(self, path: Path, reader: DataReader, block_row: int, block_col: int) -> np.ndarray | None:
+        """ Decoded block of the raster, None when the reader was closed by another thread meanwhile. """
+        key = (path, block_row, block_col)
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+                return block
+
+        row_off, col_off = block_row * reader.block_height, block_col * reader.block_width
+        window = Window(col_off, row_off, min(reader.block_width, reader.width - col_off), min(reader.block_height, reader.height - row_off))
+        with reader.lock:
+            if reader.closed:
+                return None
+            block = reader.dataset.read(1, window=window)
+
+        with self._lock:
+            if key not in self._blocks:
+                self._blocks[key] = block
+                self._block_bytes += block.nbytes
+            while self._block_bytes > self.max_block_bytes and len(self._blocks) > 1:
+                _, old_block = self._blocks.popitem(last=False)
+                self._block_bytes -= old_block.nbytes
+
+        return block
+
+
+    def sample(self, path: Path, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        """ Sample the first band of a raster at EPSG:4326 points, nan outside or on nodata. """
+        values = np.full(len(lons), np.nan, dtype=np.float64)
+
+        while True:
+            reader = self._get_reader(path)
+
+            # One transform call for all the points of this raster.
+            xs, ys = self._get_transformer(reader.crs).transform(lons, lats)
+            rows, cols = rowcol(reader.transform, np.atleast_1d(xs), np.atleast_1d(ys))
+            rows, cols = np.asarray(rows), np.asarray(cols)
+
+            inside = (rows >= 0) & (rows < reader.height) & (cols >= 0) & (cols < reader.width)
+            if not inside.any():
+                return values
+
+            block_rows, block_cols = rows // reader.block_height, cols // reader.block_width
+            for block_row, block_col in set(zip(block_rows[inside].tolist(), block_cols[inside].tolist())):
+                in_block = inside & (block_rows == block_row) & (block_cols == block_col)
+                block = self._get_block(path, reader, block_row, block_col)
+                if block is None:
+                    break
+                values[in_block] = block[rows[in_block] - block_row * reader.block_height, cols[in_block] - block_col * reader.block_width]
+            else:
+                break
+            # The reader was evicted while sampling, open the raster again.
+
+        if reader.nodata is not None and not np.isnan(reader.nodata):
+            values[values == reader.nodata] = np.nan
+
+        return values
+
+
+    def evict(self, path: Path) -> None:
+        """ Forget the handle and the blocks of a raster, for instance after it has been replaced. """
+        with self._lock:
+            reader = self._readers.pop(path, None)
+            for key in [key for key in self._blocks if key[0] == path]:
+                self._block_bytes -= self._blocks.pop(key).nbytes
+
+        if reader is not None:
+            self._close(path, reader)
+
+
+point_sampler = PointSampler(settings.POINT_READER_CACHE_SIZE, settings.POINT_BLOCK_CACHE_MB * 1024 * 1024)
@@ -7,7 +7,9 @@ from rio_tiler.models import ImageData
 from morecantile.commons import BoundingBox
 
 
-from .base import BaseManager
+from .registry import LazyRegistry
+from .base import BaseManager, DataChange, folder_signature, load_years, reload_years
+from .cog_index import CogInfo
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,6 +20,7 @@ class PredASVCogSpecie(BaseManager):
     def __init__(self, pred_cogs_path: Path, specie: str) -> None:
         super().__init__()
         self.pred_cogs_path = pred_cogs_path
+        self.specie = specie
         self.list_pred_cogs = [raster for raster in self.pred_cogs_path.iterdir() if specie in raster.name]
         
         self._spindex = self.create_index(self.list_pred_cogs)
@@ -28,6 +31,11 @@ class PredASVCogSpecie(BaseManager):
         return self._spindex
 
 
+    @property
+    def overview_key(self) -> str:
+        return f"{super().overview_key}/{self.specie}"
+
+
     def match_color_pred_file(self) -> tuple[list, dict[Path, Path]]:
         if not self.pred_cogs_path.exists():
             raise FileNotFoundError("Cannot access to predictions data, folder not found")
@@ -52,10 +60,20 @@ class PredASVCogYear():
 
     def __init__(self, pred_data_path: Path):
         self.pred_data_year_path = pred_data_path
+        self.folder_signature = folder_signature(pred_data_path)
         self.pred_cog_by_specie = self.load_pred_cog()
 
 
-    def load_pred_cog(self) -> dict[str, PredASVCogSpecie]:
+    @property
+    def cog_infos(self) -> dict[Path, CogInfo]:
+        """ Index metadata of the species of the year loaded so far. """
+        cog_infos = {}
+        for pred_specie_manager in self.pred_cog_by_specie.loaded().values():
+            cog_infos.update(pred_specie_manager.cog_infos)
+        return cog_infos
+
+
+    def load_pred_cog(self) -> LazyRegistry:
 
         if not self.pred_data_year_path.exists():
             raise FileNotFoundError("Cannot access to pred data, folder not found")
@@ -67,9 +85,8 @@ class PredASVCogYear():
             species.add(specie)
 
 
-        pred_cog_by_specie = {specie:PredASVCogSpecie(self.pred_data_year_path, specie) for specie in list(species)}
-        
-        return pred_cog_by_specie
+        # Species are indexed on first access.
+        return LazyRegistry(list(species), lambda specie: PredASVCogSpecie(self.pred_data_year_path, specie))
     
 
     def get_tile(self, specie: str, bb: BoundingBox) -> ImageData | None:
@@ -94,14 +111,22 @@ class PredASVManager:
         self.color_asv_pred_by_specie = self.get_color_pred_asv_by_specie()
 
 
-    def load_pred_cog(self) -> dict[str, PredASVCogYear]:
+    def load_pred_cog(self) -> LazyRegistry:
 
         if not self.pred_data_path.exists():
             raise FileNotFoundError("Cannot access to pred data, folder not found")
 
-        pred_cog_by_year = {byp.name:PredASVCogYear(byp) for byp in self.pred_data_path.iterdir() if byp.is_dir()}
-        
-        return pred_cog_by_year
+        # Years are indexed on first access.
+        return load_years(self.pred_data_path, PredASVCogYear)
+
+
+    def reload(self) -> dict[str, DataChange]:
+        """ Rebuild the years whose folder changed since the last load, with every specie of the year. """
+        self.pred_cog_by_year, changes = reload_years(self.pred_cog_by_year, self.pred_data_path, PredASVCogYear)
+        if len(changes) > 0:
+            self.species = self.get_species()
+            self.color_asv_pred_by_specie = self.get_color_pred_asv_by_specie()
+        return changes
     
 
     def get_tile(self, year: str, specie: str, bb: BoundingBox) -> ImageData | None:
@@ -1,13 +1,12 @@
 import logging
 import pyqtree
+import numpy as np
 from pathlib import Path
 from rio_tiler.models import ImageData
 from morecantile.commons import BoundingBox
 
-import rasterio
-from rasterio.warp import transform
-
-from .base import BaseManager
+from .registry import LazyRegistry
+from .base import BaseManager, DataChange, folder_signature, load_years, reload_years
 
 LABEL_TEXT_MATCHING = {
     "1": "Acropora Branching", 
@@ -23,9 +22,15 @@ logger = logging.getLogger(__name__)
 
 class PredIGNCogYear(BaseManager):
 
+    colormap_path = Path("tools/pred_ign/color.txt")
+    colormap_categorical = True
+    # Class 0 is transparent on the map, the prediction COG don't declare it as nodata.
+    point_nodata = 0
+
     def __init__(self, pred_cogs_path: Path) -> None:
         super().__init__()
         self.pred_cogs_path = pred_cogs_path
+        self.folder_signature = folder_signature(pred_cogs_path)
         self.list_pred_cogs, self.pred_file_by_color = self.match_color_pred_file()
 
         self._spindex = self.create_index(self.list_pred_cogs)
@@ -56,26 +61,20 @@ class PredIGNCogYear(BaseManager):
         return list_color_cogs, pred_file_by_color
         
 
-    def get_prediction(self, lon: float, lat: float) -> str | None:
+    def get_data_file(self, file: Path) -> Path | None:
+        return self.pred_file_by_color.get(file, None)
 
-        list_cogs = self.spindex.intersect((lon, lat, lon, lat))
-        if len(list_cogs) == 0:
-            return None
-        
-        pred_path = self.pred_file_by_color.get(list_cogs[0], None)
-        if pred_path == None or not pred_path.exists():
-            return None
-        
-        with rasterio.open(pred_path) as src:
-            raster_crs = src.crs
 
-            # Transform lon/lat (EPSG:4326) into raster CRS
-            xs, ys = transform("EPSG:4326", raster_crs, [lon], [lat])
-            xs, ys = xs[0], ys[0]
+    def get_prediction(self, lon: float, lat: float) -> str | None:
+        """ Return the prediction at a given location. """
+        return self.get_predictions(np.array([lon]), np.array([lat]))[0]
+
 
-            val = list(src.sample([(xs, ys)]))[0][0]
+    def get_predictions(self, lons: np.ndarray, lats: np.ndarray) -> list[str | None]:
+        """ Return the prediction at each point. """
+        values = self.sample_points(lons, lats, self.pred_file_by_color)
 
-        return LABEL_TEXT_MATCHING.get(str(val), None)
+        return [None if np.isnan(v) else LABEL_TEXT_MATCHING.get(str(int(v)), None) for v in values]
 
 
 
@@ -97,14 +96,19 @@ class PredIGNManager:
         return {"title": "Habitat Prediction by aerial imagery", "legend": color_dict, "description": "Click on map to get local habitat prediction."}
 
 
-    def load_pred_cog(self) -> dict[str, PredIGNCogYear]:
+    def load_pred_cog(self) -> LazyRegistry:
 
         if not self.pred_data_path.exists():
             raise FileNotFoundError("Cannot access to pred data, folder not found")
 
-        pred_cog_by_year = {pyp.name:PredIGNCogYear(pyp) for pyp in self.pred_data_path.iterdir()}
+        # Years are indexed on first access.
+        return load_years(self.pred_data_path, PredIGNCogYear)
+
 
-        return pred_cog_by_year
+    def reload(self) -> dict[str, DataChange]:
+        """ Rebuild the years whose folder changed since the last load. """
+        self.pred_cog_by_year, changes = reload_years(self.pred_cog_by_year, self.pred_data_path, PredIGNCogYear)
+        return changes
     
 
     def get_tile(self, year: str, bb: BoundingBox) -> ImageData | None:
@@ -133,4 +137,15 @@ class PredIGNManager:
         return pred
 
 
+    def get_predictions(self, lons: np.ndarray, lats: np.ndarray, year: str) -> list[str | None]:
+
+        pred_year_manager = self.pred_cog_by_year.get(year, None)
+
+        if pred_year_manager == None:
+            logger.error(f"Pred for year {year} not found.")
+            return [None] * len(lons)
+
+        return pred_year_manager.get_predictions(lons, lats)
+
+
 
@@ -0,0 +1,89 @@
+import logging
+import threading
+from typing import Callable, Iterator
+from collections.abc import Mapping
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class LazyRegistry(Mapping):
+    """ Read-only dict of managers, each one built on first access. A manager failing to build is reported as missing. """
+
+    def __init__(self, names: list[str], factory: Callable[[str], object]) -> None:
+        self.names = sorted(names)
+        self.factory = factory
+        self.errors: dict[str, str] = {}
+
+        self._managers: dict[str, object] = {}
+        self._locks = {name: threading.Lock() for name in self.names}
+
+
+    def __getitem__(self, name: str):
+        manager = self._managers.get(name)
+        if manager is not None:
+            return manager
+
+        if name not in self._locks:
+            raise KeyError(name)
+
+        # One thread builds the manager, the others wait for it.
+        with self._locks[name]:
+            manager = self._managers.get(name)
+            if manager is not None:
+                return manager
+            if name in self.errors:
+                raise KeyError(name)
+
+            try:
+                manager = self.factory(name)
+            except Exception as e:
+                logger.exception(f"Cannot load {name}")
+                self.errors[name] = str(e)
+                raise KeyError(name)
+
+            self._managers[name] = manager
+            return manager
+
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+    def set(self, name: str, manager: object) -> None:
+        """ Insert an already built manager, used when a reload keeps or rebuilds it. """
+        self._managers[name] = manager
+
+
+    def peek(self, name: str):
+        """ The manager if already built, None otherwise. Never blocks. """
+        return self._managers.get(name)
+
+
+    def clear_errors(self) -> None:
+        """ Build the managers that failed again on their next access, for instance once their files are complete. """
+        self.errors.clear()
+
+
+    def loaded(self) -> dict[str, object]:
+        """ Managers built so far, without building the others. """
+        return dict(self._managers)
+
+
+    def warm_up(self) -> None:
+        """ Build every manager, most recent names first. """
+        for name in reversed(self.names):
+            self.get(name)
+
+
+    def status(self) -> dict:
+        return {
+            "total": len(self.names),
+            "loaded": len(self._managers),
+            "indexed": len(self._managers) + len(self.errors) == len(self.names),
+            "errors": dict(self.errors),
+        }
@@ -0,0 +1,97 @@
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+
+from .general import GeneralManager
+from .tile_cache import TileCache
+from .base import reader_cache, signature_fingerprint
+from .point import point_sampler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class DataReloader:
+    """ Pick up surveys added, replaced or removed in the data folder without restarting the workers. """
+
+    def __init__(self, general_manager: GeneralManager, tile_cache: TileCache | None, stamp_path: Path, interval: float) -> None:
+        self.general_manager = general_manager
+        self.tile_cache = tile_cache
+        self.stamp_path = stamp_path  # Touched to ask every worker to reload
+        self.interval = interval      # Seconds between two scans of the data folder, 0 to only reload on request
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stamp = self.read_stamp()
+        self.last_reload: float | None = None
+
+
+    def reload(self) -> dict:
+        """ Swap in the rebuilt year indexes, then forget the readers and tiles of the changed files. """
+        with self._lock:
+            start = time.perf_counter()
+            changes = self.general_manager.reload()
+
+            summary = {}
+            for collection_name, changes_by_year in changes.items():
+                for year, change in changes_by_year.items():
+                    for path in change.paths:
+                        reader_cache.evict(path)
+                        point_sampler.evict(path)
+
+                    evicted_tiles = 0
+                    if self.tile_cache != None:
+                        evicted_tiles = self.tile_cache.evict_year(collection_name, year, change.bounds)
+                        # The other tiles are up to date, they are kept when the renderers check the year version.
+                        year_manager = self.general_manager.get_loaded_year(collection_name, year)
+                        if year_manager != None:
+                            self.tile_cache.set_year(collection_name, year, signature_fingerprint(year_manager.folder_signature))
+
+                    summary.setdefault(collection_name, {})[year] = {"files": len(change.paths), "evicted_tiles": evicted_tiles}
+                    logger.info(f"Reloaded {collection_name} {year}: {len(change.paths)} files changed, {evicted_tiles} tiles evicted")
+
+            self.last_reload = time.time()
+            return {"duration_ms": round((time.perf_counter() - start) * 1000, 2), "changes": summary}
+
+
+    def request_reload(self) -> None:
+        """ Touch the stamp file so the watchers of the other workers reload too. """
+        self.stamp_path.parent.mkdir(parents=True, exist_ok=True)
+        self.stamp_path.touch()
+        self._stamp = self.read_stamp()
+
+
+    def read_stamp(self) -> int | None:
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._watch, name="data-reloader", daemon=True)
+        self._thread.start()
+
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+    def _watch(self) -> None:
+        """ Check the stamp every second and scan the data folder every interval. """
+        next_scan = time.monotonic() + self.interval
+        while not self._stop.wait(1):
+            stamp = self.read_stamp()
+            due = self.interval > 0 and time.monotonic() >= next_scan
+            if stamp == self._stamp and not due:
+                continue
+
+            self._stamp = stamp
+            next_scan = time.monotonic() + self.interval
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("Data reload failed")
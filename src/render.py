@@ -0,0 +1,187 @@
+import logging
+import threading
+import dataclasses
+from pathlib import Path
+from rio_tiler.models import ImageData
+
+from .base import ParametersCOG, TileStats, signature_fingerprint
+from .general import GeneralManager, ManagerType
+from .encoding import encode_tile, empty_tile
+from .encode_pool import EncodePool
+from .tile_cache import TMS, TileCache, tile_etag
+from .tools import retrieve_transparent_image
+from .overview import overview_store
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TileRenderer:
+    """ Blocking tile pipeline: read the COG, merge and encode to PNG, WebP or JPEG bytes. """
+
+    def __init__(self, general_manager: GeneralManager, data_path: Path, tile_cache: TileCache | None = None, encode_pool: EncodePool | None = None, metatile_size: int = 1) -> None:
+        self.general_manager = general_manager
+        self.transparent_path = Path(data_path, "transparent.png")
+        self.tile_cache = tile_cache
+        self.encode_pool = encode_pool  # Encode in other processes, None to encode in the render thread
+        self.metatile_size = metatile_size  # Tiles read together on a cache miss, by side. 1 renders each tile alone
+
+        # Year manager whose folder version was last checked against the tile cache, by collection and year.
+        self._synced_years: dict[tuple[str, str], object] = {}
+
+        # A metatile is rendered once at a time, the other tiles of the block wait for it and find themselves in the cache.
+        self._metatile_locks = [threading.Lock() for _ in range(64)]
+
+
+    def get_transparent_png(self) -> bytes:
+        return retrieve_transparent_image(self.transparent_path)
+
+
+    def get_empty_tile(self, img_format: str, tilesize: int = 256) -> bytes:
+        if img_format == "png" and tilesize == 256:
+            return self.get_transparent_png()
+        return empty_tile(img_format, tilesize)
+
+
+    def encode(self, collection_name: str, tile: ImageData | None, params: ParametersCOG) -> bytes:
+        if tile == None:
+            return self.get_empty_tile(params.img_format, params.tilesize)
+
+        with params.stats.stage("encode"):
+            if self.encode_pool != None:
+                return self.encode_pool.encode(tile, params.img_format, ManagerType.get_palette(collection_name))
+            return encode_tile(tile, params.img_format, ManagerType.get_palette(collection_name))
+
+
+    def render_tile(self, collection_name: str, year: str, params: ParametersCOG) -> bytes:
+        """ Render a tile of a collection. """
+        return self._render_cached(
+            collection_name, year, None, params,
+            lambda p: self.general_manager.get_tile(collection_name, year, p)
+        )
+
+
+    def render_specie_tile(self, collection_name: str, year: str, specie: str, params: ParametersCOG) -> bytes:
+        """ Render a tile of a collection split by specie. """
+        return self._render_cached(
+            collection_name, year, specie, params,
+            lambda p: self.general_manager.get_tile_with_species(collection_name, year, specie, p)
+        )
+
+
+    def get_etag(self, collection_name: str, year: str, specie: str | None, params: ParametersCOG) -> str | None:
+        """ ETag of a tile from the index and the sources mtime, without reading any raster. None for empty tiles. """
+        key = TileCache.build_key(collection_name, year, specie, params.z, params.x, params.y, params.with_asv, params.style_key(), params.img_format)
+
+        archive = self.general_manager.get_archive(collection_name, year, specie, params)
+        if archive != None:
+            return tile_etag(key, archive.fingerprint)
+
+        sources = self.general_manager.get_tile_sources(collection_name, year, specie, params)
+        if len(sources) == 0:
+            return None
+        return tile_etag(key, self.general_manager.get_source_fingerprint(collection_name, year, specie, sources))
+
+
+    def _render_cached(self, collection_name: str, year: str, specie: str | None, params: ParametersCOG, get_tile) -> bytes:
+        """ Look for the tile in the archive then in the cache before reading the COG. """
+        key = TileCache.build_key(collection_name, year, specie, params.z, params.x, params.y, params.with_asv, params.style_key(), params.img_format)
+
+        archive = self.general_manager.get_archive(collection_name, year, specie, params)
+        if archive != None:
+            with params.stats.stage("archive"):
+                tile_data = archive.get_tile(params.z, params.x, params.y)
+            params.stats.cache = "archive"
+            if tile_data == None:
+                return self.get_empty_tile(params.img_format, params.tilesize)
+            params.etag = tile_etag(key, archive.fingerprint)
+            return tile_data
+
+        with params.stats.stage("index"):
+            sources = self.general_manager.get_tile_sources(collection_name, year, specie, params)
+        params.stats.sources = len(sources)
+        if len(sources) == 0:
+            return self.get_empty_tile(params.img_format, params.tilesize)
+
+        fingerprint = self.general_manager.get_source_fingerprint(collection_name, year, specie, sources)
+        params.etag = tile_etag(key, fingerprint)
+
+        if self.tile_cache == None:
+            return self.encode(collection_name, get_tile(params), params)
+        self.sync_year(collection_name, year)
+
+        with params.stats.stage("cache"):
+            tile_data, params.stats.cache = self.tile_cache.get(key, fingerprint)
+        if tile_data != None:
+            return tile_data
+
+        metatile = self.get_metatile(params)
+        if metatile == None:
+            tile_data = self.encode(collection_name, get_tile(params), params)
+            with params.stats.stage("cache"):
+                self.tile_cache.put(key, fingerprint, tile_data)
+            return tile_data
+
+        with self._metatile_locks[hash((collection_name, year, specie, metatile.z, metatile.x, metatile.y)) % len(self._metatile_locks)]:
+            # Rendered by a neighbour while waiting for the lock.
+            with params.stats.stage("cache"):
+                tile_data, tier = self.tile_cache.get(key, fingerprint)
+            if tile_data != None:
+                params.stats.cache = tier
+                return tile_data
+
+            return self.render_metatile(collection_name, year, specie, params, metatile, get_tile)
+
+
+    def sync_year(self, collection_name: str, year: str) -> None:
+        """ Drop the cached tiles of a year once, when its folder changed since they were stored. """
+        year_manager = self.general_manager.get_loaded_year(collection_name, year)
+        if year_manager == None or self._synced_years.get((collection_name, year)) is year_manager:
+            return
+
+        self.tile_cache.sync_year(collection_name, year, signature_fingerprint(year_manager.folder_signature))
+        self._synced_years[(collection_name, year)] = year_manager
+
+
+    def get_metatile(self, params: ParametersCOG) -> ParametersCOG | None:
+        """
+        Parameters of the block of metatile_size x metatile_size tiles holding the tile: the tile of a lower
+        zoom level with a larger tile size, so each source is read once for the whole block. None to render the tile alone.
+        """
+        shift = self.metatile_size.bit_length() - 1
+        # Blocks of overview zoom levels would be read from the overview of a lower level.
+        if shift == 0 or params.z - shift < overview_store.min_zoom:
+            return None
+
+        x, y, z = params.x >> shift, params.y >> shift, params.z - shift
+        return dataclasses.replace(params, x=x, y=y, z=z, bb=TMS.bounds(x, y, z), tilesize=params.tilesize << shift)
+
+
+    def render_metatile(self, collection_name: str, year: str, specie: str | None, params: ParametersCOG, metatile: ParametersCOG, get_tile) -> bytes:
+        """ Read the block, then encode and cache each of its tiles having sources. Return the requested tile. """
+        image = get_tile(metatile)
+        size, shift = params.tilesize, self.metatile_size.bit_length() - 1
+
+        tile_data = None
+        for x in range(metatile.x << shift, (metatile.x + 1) << shift):
+            for y in range(metatile.y << shift, (metatile.y + 1) << shift):
+                # The stats of the request also count the time spent on its neighbours.
+                tile_params = dataclasses.replace(params, x=x, y=y, bb=TMS.bounds(x, y, params.z))
+                sources = self.general_manager.get_tile_sources(collection_name, year, specie, dataclasses.replace(tile_params, stats=TileStats()))
+                if len(sources) == 0:
+                    continue
+
+                tile = None
+                if image != None:
+                    col, row = (x - (metatile.x << shift)) * size, (y - (metatile.y << shift)) * size
+                    tile = ImageData(image.array[:, row:row + size, col:col + size], crs=image.crs, bounds=TMS.xy_bounds(x, y, params.z))
+
+                data = self.encode(collection_name, tile, tile_params)
+                if (x, y) == (params.x, params.y):
+                    tile_data = data
+
+                key = TileCache.build_key(collection_name, year, specie, params.z, x, y, params.with_asv, params.style_key(), params.img_format)
+                with params.stats.stage("cache"):
+                    self.tile_cache.put(key, self.general_manager.get_source_fingerprint(collection_name, year, specie, sources), data)
+
+        return tile_data
@@ -0,0 +1,100 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    """ Read an integer setting from the environment. """
+    value = os.environ.get(name)
+    return default if value in (None, "") else int(value)
+
+
+def _env_float(name: str, default: float) -> float:
+    """ Read a float setting from the environment. """
+    value = os.environ.get(name)
+    return default if value in (None, "") else float(value)
+
+
+# Threads used by each uvicorn worker to read COG and encode tiles.
+RENDER_THREADS = _env_int("COG_SERVER_RENDER_THREADS", os.cpu_count() or 4)
+
+# Maximum number of renders queued or running in a worker before answering 503.
+MAX_INFLIGHT_RENDERS = _env_int("COG_SERVER_MAX_INFLIGHT", RENDER_THREADS * 4)
+
+# Seconds a request waits for a render slot before being rejected.
+RENDER_QUEUE_TIMEOUT = _env_float("COG_SERVER_QUEUE_TIMEOUT", 5.0)
+
+# Folder of the collections served, one sub folder by collection and year.
+DATA_PATH = os.environ.get("COG_SERVER_DATA_PATH", "./data")
+
+# Folder for files generated by the server (tile cache, index, ...), shared by all workers.
+CACHE_PATH = os.environ.get("COG_SERVER_CACHE_PATH", "./data/.cache")
+
+# Size of the in-process rendered tile cache, in megabytes. 0 disables it.
+TILE_CACHE_MEMORY_MB = _env_int("COG_SERVER_TILE_CACHE_MEMORY_MB", 64)
+
+# Store rendered tiles in a sqlite file shared by all workers. 0 disables it.
+TILE_CACHE_DISK = _env_int("COG_SERVER_TILE_CACHE_DISK", 1)
+
+# Size of the sqlite tile store, in megabytes. The least recently read tiles are dropped past it. 0 for no limit.
+TILE_CACHE_DISK_MB = _env_int("COG_SERVER_TILE_CACHE_DISK_MB", 2048)
+
+# Maximum number of points accepted by one batch point query.
+MAX_BATCH_POINTS = _env_int("COG_SERVER_MAX_BATCH_POINTS", 100000)
+
+# Data rasters kept open for point queries in each worker.
+POINT_READER_CACHE_SIZE = _env_int("COG_SERVER_POINT_READER_CACHE_SIZE", 64)
+
+# Decoded raster blocks kept for point queries in each worker, in megabytes.
+POINT_BLOCK_CACHE_MB = _env_int("COG_SERVER_POINT_BLOCK_CACHE_MB", 32)
+
+# COG handles kept open by each worker, shared by every collection.
+READER_MAX_HANDLES = _env_int("COG_SERVER_READER_MAX_HANDLES", 256)
+
+# Handles of a same COG, so concurrent tiles reading it don't wait for each other.
+READER_HANDLES_PER_COG = _env_int("COG_SERVER_READER_HANDLES_PER_COG", 4)
+
+# Estimated memory of the COG handles kept open by each worker, in megabytes.
+READER_MAX_MB = _env_int("COG_SERVER_READER_MAX_MB", 256)
+
+# Serve ortho and IGN png tiles as lossy webp to clients accepting it. 0 disables it.
+NEGOTIATE_FORMAT = _env_int("COG_SERVER_NEGOTIATE_FORMAT", 1)
+
+# Folder of prerendered MBTiles archives, served before reading the COG.
+ARCHIVE_PATH = os.environ.get("COG_SERVER_ARCHIVE_PATH", "./data/.archives")
+
+# Seconds between two scans of the data folder for new, replaced or removed COG. 0 only reloads on POST /admin/reload.
+RELOAD_INTERVAL = _env_float("COG_SERVER_RELOAD_INTERVAL", 0)
+
+# Token expected in the X-Admin-Token header of the admin endpoints. Empty disables them.
+ADMIN_TOKEN = os.environ.get("COG_SERVER_ADMIN_TOKEN", "")
+
+# Index every year in a background thread at startup instead of on the first request of each layer. 0 disables it.
+WARMUP = _env_int("COG_SERVER_WARMUP", 0)
+
+# Zoom levels served above the native resolution of a layer, deeper tiles are answered empty without reading.
+MAX_OVERZOOM = _env_int("COG_SERVER_MAX_OVERZOOM", 3)
+
+# Status of empty tiles outside the coverage of a layer: 200 with a transparent tile or 204 without body.
+EMPTY_TILE_STATUS = _env_int("COG_SERVER_EMPTY_TILE_STATUS", 200)
+
+# Seconds clients may reuse a tile without revalidating it.
+TILE_MAX_AGE = _env_int("COG_SERVER_TILE_MAX_AGE", 3600)
+
+# Seconds clients may reuse a tile of a year served from an archive, which no longer changes.
+ARCHIVED_TILE_MAX_AGE = _env_int("COG_SERVER_ARCHIVED_TILE_MAX_AGE", 30 * 24 * 3600)
+
+# Threads reading sources in each worker, shared by every tile in flight.
+READ_THREADS = _env_int("COG_SERVER_READ_THREADS", (os.cpu_count() or 4) * 2)
+
+# Sources of one tile read at the same time. 1 reads them one after the other in the render thread.
+READS_PER_TILE = _env_int("COG_SERVER_READS_PER_TILE", 4)
+
+# Tiles below this zoom level are read from a pre-merged overview of their collection year, built in the
+# background under the cache folder. 0 disables the overviews.
+OVERVIEW_ZOOM = _env_int("COG_SERVER_OVERVIEW_ZOOM", 0)
+
+# Processes encoding the tiles of each worker, fed through shared memory. 0 encodes in the render threads.
+ENCODE_PROCESSES = _env_int("COG_SERVER_ENCODE_PROCESSES", 0)
+
+# Tiles rendered together on a cache miss, by side of the block: 2 reads each source once for 2 x 2 neighbour tiles
+# and caches all of them. Power of 2, 1 renders each tile alone.
+METATILE_SIZE = _env_int("COG_SERVER_METATILE_SIZE", 1)
@@ -0,0 +1,346 @@
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import morecantile
+from pathlib import Path
+from typing import Callable
+from collections import OrderedDict
+
+from .cog_index import CogInfo
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TMS = morecantile.tms.get("WebMercatorQuad")
+
+
+def source_fingerprint(paths: list[Path], cog_infos: dict[Path, CogInfo]) -> str:
+    """
+    Hash the name, mtime and size of the COG used to build a tile, as recorded in the index of the year: no stat by tile.
+    The name only, so the spelling of DATA_PATH doesn't matter.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        info = cog_infos.get(path)
+        if info == None:
+            h.update(f"{path.name}:missing;".encode())
+        else:
+            h.update(f"{path.name}:{info.mtime_ns}:{info.size};".encode())
+    return h.hexdigest()
+
+
+def prefix_range(prefix: str) -> tuple[str, str]:
+    """ Bounds of the keys starting with prefix, for a range query on the primary key. LIKE would read _ as a wildcard. """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def tile_etag(key: str, fingerprint: str) -> str:
+    """ HTTP ETag of a tile: its cache key (position and render parameters) and the fingerprint of its sources. """
+    return f'"{hashlib.blake2b(f"{key}:{fingerprint}".encode(), digest_size=12).hexdigest()}"'
+
+
+class MemoryTileCache:
+    """ LRU of encoded tiles bounded by the total number of bytes. """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._cache: OrderedDict[str, tuple[str, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key: str, fingerprint: str) -> bytes | None:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+
+            if entry[0] != fingerprint:
+                # Sources changed since the tile was rendered.
+                self._pop(key)
+                return None
+
+            self._cache.move_to_end(key)
+            return entry[1]
+
+
+    def put(self, key: str, fingerprint: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+
+        with self._lock:
+            self._pop(key)
+            self._cache[key] = (fingerprint, data)
+            self.current_bytes += len(data)
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, old_data) = self._cache.popitem(last=False)
+                self.current_bytes -= len(old_data)
+
+
+    def evict(self, match: Callable[[str], bool]) -> int:
+        with self._lock:
+            keys = [key for key in self._cache if match(key)]
+            for key in keys:
+                self._pop(key)
+        return len(keys)
+
+
+    def _pop(self, key: str) -> None:
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= len(entry[1])
+
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+class DiskTileCache:
+    """ Sqlite store of encoded tiles, shared by every uvicorn worker. Least recently read tiles are dropped past max_bytes. """
+
+    # Reads of a tile update its access time at most once by this many seconds, to keep reads from writing.
+    ACCESS_RESOLUTION = 60
+    # The size of the store is checked every this many tiles written by the worker.
+    PRUNE_EVERY = 256
+
+    def __init__(self, db_path: Path, max_bytes: int = 0) -> None:
+        self.db_path = db_path
+        self.max_bytes = max_bytes  # 0 for no limit
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._writes = 0
+        self._prune_lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # The size comes before the data so summing it doesn't read the tiles.
+            conn.execute("CREATE TABLE IF NOT EXISTS tiles (key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, size INTEGER NOT NULL DEFAULT 0, accessed INTEGER NOT NULL DEFAULT 0, data BLOB NOT NULL)")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(tiles)")]
+            if "size" not in columns:
+                # Store created before the size limit.
+                conn.execute("ALTER TABLE tiles ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                conn.execute("ALTER TABLE tiles ADD COLUMN accessed INTEGER NOT NULL DEFAULT 0")
+                conn.execute("UPDATE tiles SET size = length(data)")
+            conn.execute("CREATE INDEX IF NOT EXISTS tiles_accessed ON tiles (accessed)")
+            conn.execute("CREATE TABLE IF NOT EXISTS years (prefix TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)")
+
+        self.prune()
+
+
+    def _connect(self) -> sqlite3.Connection:
+        """ Sqlite connections cannot be shared between threads, keep one per thread. """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+        return conn
+
+
+    def get(self, key: str, fingerprint: str) -> bytes | None:
+        row = self._connect().execute("SELECT fingerprint, accessed, data FROM tiles WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] != fingerprint:
+            return None
+
+        now = int(time.time())
+        if now - row[1] >= self.ACCESS_RESOLUTION:
+            with self._connect() as conn:
+                conn.execute("UPDATE tiles SET accessed = ? WHERE key = ?", (now, key))
+        return row[2]
+
+
+    def put(self, key: str, fingerprint: str, data: bytes) -> None:
+        self.put_many([(key, fingerprint, data)])
+
+
+    def put_many(self, rows: list[tuple[str, str, bytes]]) -> None:
+        """ Insert (key, fingerprint, data) rows in one transaction. """
+        now = int(time.time())
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO tiles (key, fingerprint, size, accessed, data) VALUES (?, ?, ?, ?, ?)",
+                [(key, fingerprint, len(data), now, data) for key, fingerprint, data in rows]
+            )
+
+        self._writes += len(rows)
+        if self._writes >= self.PRUNE_EVERY:
+            self._writes = 0
+            self.prune()
+
+
+    def prune(self) -> int:
+        """ Drop the least recently read tiles until the store is back under 90 % of max_bytes. """
+        if self.max_bytes <= 0 or not self._prune_lock.acquire(blocking=False):
+            return 0
+
+        try:
+            conn = self._connect()
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+
+            to_free, keys = total - int(self.max_bytes * 0.9), []
+            for key, size in conn.execute("SELECT key, size FROM tiles ORDER BY accessed"):
+                keys.append((key,))
+                to_free -= size
+                if to_free <= 0:
+                    break
+
+            with conn:
+                conn.executemany("DELETE FROM tiles WHERE key = ?", keys)
+            logger.info(f"Tile cache over {self.max_bytes // (1024 * 1024)} MB, {len(keys)} tiles dropped")
+            return len(keys)
+        finally:
+            self._prune_lock.release()
+
+
+    def evict(self, prefix: str, match: Callable[[str], bool]) -> int:
+        keys = [(key,) for (key,) in self._connect().execute("SELECT key FROM tiles WHERE key >= ? AND key < ?", prefix_range(prefix)) if match(key)]
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM tiles WHERE key = ?", keys)
+        return len(keys)
+
+
+    def sync_year(self, prefix: str, fingerprint: str) -> int:
+        """ Record the version of a collection year, drop its tiles when it differs from the recorded one. """
+        with self._connect() as conn:
+            row = conn.execute("SELECT fingerprint FROM years WHERE prefix = ?", (prefix,)).fetchone()
+            if row is not None and row[0] == fingerprint:
+                return 0
+
+            evicted = 0
+            if row is not None:
+                evicted = conn.execute("DELETE FROM tiles WHERE key >= ? AND key < ?", prefix_range(prefix)).rowcount
+            conn.execute("INSERT OR REPLACE INTO years (prefix, fingerprint) VALUES (?, ?)", (prefix, fingerprint))
+        return evicted
+
+
+    def set_year(self, prefix: str, fingerprint: str) -> None:
+        """ Record the version of a collection year whose changed tiles were already evicted. """
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO years (prefix, fingerprint) VALUES (?, ?)", (prefix, fingerprint))
+
+
+    def has(self, key: str, fingerprint: str) -> bool:
+        """ True when the tile is stored and up to date, without reading it. """
+        row = self._connect().execute("SELECT fingerprint FROM tiles WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] == fingerprint
+
+
+class TileCache:
+    """ Rendered tile cache: a memory LRU per worker in front of a disk store shared by workers. """
+
+    def __init__(self, cache_path: Path, memory_mb: int, use_disk: bool, disk_mb: int = 0) -> None:
+        self.memory = MemoryTileCache(memory_mb * 1024 * 1024) if memory_mb > 0 else None
+        self.disk = DiskTileCache(Path(cache_path, "tiles.sqlite"), disk_mb * 1024 * 1024) if use_disk else None
+
+        self.memory_hits, self.disk_hits, self.misses = 0, 0, 0
+
+
+    @staticmethod
+    def build_key(collection_name: str, year: str, specie: str | None, z: int, x: int, y: int, with_asv: bool, style: str = "color", img_format: str = "png") -> str:
+        return f"{collection_name}/{year}/{specie or '-'}/{z}/{x}/{y}/{int(with_asv)}/{style}.{img_format}"
+
+
+    def get(self, key: str, fingerprint: str) -> tuple[bytes | None, str]:
+        """ Return the tile and the tier it was found in (memory, disk or miss). """
+        if self.memory != None:
+            data = self.memory.get(key, fingerprint)
+            if data != None:
+                self.memory_hits += 1
+                return data, "memory"
+
+        if self.disk != None:
+            try:
+                data = self.disk.get(key, fingerprint)
+            except sqlite3.Error as e:
+                logger.warning(f"Tile cache read failed for {key}: {e}")
+                data = None
+
+            if data != None:
+                self.disk_hits += 1
+                if self.memory != None:
+                    self.memory.put(key, fingerprint, data)
+                return data, "disk"
+
+        self.misses += 1
+        return None, "miss"
+
+
+    def put(self, key: str, fingerprint: str, data: bytes) -> None:
+        if self.memory != None:
+            self.memory.put(key, fingerprint, data)
+
+        if self.disk != None:
+            try:
+                self.disk.put(key, fingerprint, data)
+            except sqlite3.Error as e:
+                logger.warning(f"Tile cache write failed for {key}: {e}")
+
+
+    def evict_year(self, collection_name: str, year: str, bounds_list: list[tuple[float, float, float, float]] | None = None) -> int:
+        """ Drop the tiles of a collection year intersecting any of the bounds (EPSG:4326), all of them when bounds_list is None. """
+        prefix = f"{collection_name}/{year}/"
+
+        def match(key: str) -> bool:
+            if not key.startswith(prefix):
+                return False
+            if bounds_list == None:
+                return True
+            z, x, y = (int(v) for v in key.split("/")[3:6])
+            bb = TMS.bounds(x, y, z)
+            return any(bb.left < b[2] and bb.right > b[0] and bb.bottom < b[3] and bb.top > b[1] for b in bounds_list)
+
+        evicted = 0
+        if self.memory != None:
+            evicted += self.memory.evict(match)
+
+        if self.disk != None:
+            try:
+                evicted += self.disk.evict(prefix, match)
+            except sqlite3.Error as e:
+                logger.warning(f"Tile cache eviction failed for {prefix}: {e}")
+
+        return evicted
+
+
+    def sync_year(self, collection_name: str, year: str, fingerprint: str) -> int:
+        """ Drop every tile of a collection year changed on disk since its tiles were stored, by another run or worker. """
+        prefix = f"{collection_name}/{year}/"
+        if self.disk == None:
+            return 0
+
+        try:
+            evicted = self.disk.sync_year(prefix, fingerprint)
+        except sqlite3.Error as e:
+            logger.warning(f"Tile cache sync failed for {prefix}: {e}")
+            return 0
+
+        if evicted > 0:
+            if self.memory != None:
+                self.memory.evict(lambda key: key.startswith(prefix))
+            logger.info(f"{prefix} changed since its tiles were cached, {evicted} tiles evicted")
+        return evicted
+
+
+    def set_year(self, collection_name: str, year: str, fingerprint: str) -> None:
+        if self.disk == None:
+            return
+        try:
+            self.disk.set_year(f"{collection_name}/{year}/", fingerprint)
+        except sqlite3.Error as e:
+            logger.warning(f"Tile cache sync failed for {collection_name}/{year}: {e}")
+
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory) if self.memory != None else 0,
+            "memory_bytes": self.memory.current_bytes if self.memory != None else 0,
+        }
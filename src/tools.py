@@ -1,13 +1,42 @@
 import io
+import math
 import functools
 from PIL import Image
 from pathlib import Path
+from morecantile.commons import BoundingBox
 
 @functools.lru_cache()
-def retrieve_transparent_image(transparent_path: Path) -> io.BytesIO:
+def retrieve_transparent_image(transparent_path: Path) -> bytes:
+    """ Transparent PNG served for empty tiles, encoded once and shared by every response. """
     buf_transparent = io.BytesIO()
     img = Image.open(transparent_path)
     img.save(buf_transparent, "PNG")
 
-    return buf_transparent
+    return buf_transparent.getvalue()
 
+
+
+def lat_to_mercator(lat: float) -> float:
+    """ Latitude in degrees to the web mercator y, up to a constant factor. """
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+
+def bounds_to_tile_window(bounds: tuple[float, float, float, float], bb: BoundingBox, tilesize: int = 256) -> tuple[slice, slice] | None:
+    """ Pixels of a web mercator tile covered by EPSG:4326 bounds, None if they do not overlap. """
+    minx, miny, maxx, maxy = bounds
+
+    col_start = (minx - bb.left) / (bb.right - bb.left) * tilesize
+    col_stop = (maxx - bb.left) / (bb.right - bb.left) * tilesize
+
+    top, bottom = lat_to_mercator(bb.top), lat_to_mercator(bb.bottom)
+    row_start = (top - lat_to_mercator(maxy)) / (top - bottom) * tilesize
+    row_stop = (top - lat_to_mercator(miny)) / (top - bottom) * tilesize
+
+    col_start, col_stop = max(0, math.floor(col_start)), min(tilesize, math.ceil(col_stop))
+    row_start, row_stop = max(0, math.floor(row_start)), min(tilesize, math.ceil(row_stop))
+
+    if col_start >= col_stop or row_start >= row_stop:
+        return None
+
+    return slice(row_start, row_stop), slice(col_start, col_stop)
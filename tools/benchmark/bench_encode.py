@@ -0,0 +1,83 @@
+"""
+Compare encode time and size of the tile formats over a sample of real tiles, read from the color COG or colored from the data COG.
+
+Run from the repository root, with the data folder used by the server:
+    python -m tools.benchmark.bench_encode --collection pred_ign --year 2023 --zoom 16 18 --samples 50 --render data
+"""
+import time
+import random
+import argparse
+import numpy as np
+from pathlib import Path
+import morecantile
+
+from src.base import ParametersCOG
+from src.general import GeneralManager, ManagerType
+from src.encoding import encode_tile
+
+
+def sample_tiles(general_manager: GeneralManager, collection_name: str, year: str, zooms: list[int], nb_samples: int, seed: int, render: str) -> list:
+    """ Render random non-empty tiles inside the extent of the collection year. """
+    year_manager = general_manager.get_year_manager(collection_name, year)
+    if year_manager == None:
+        raise SystemExit(f"No data for {collection_name} {year}")
+
+    tms = morecantile.tms.get("WebMercatorQuad")
+    rng = random.Random(seed)
+    infos = list(year_manager.cog_infos.values())
+
+    tiles, attempts = [], 0
+    while len(tiles) < nb_samples and attempts < nb_samples * 20:
+        attempts += 1
+        minx, miny, maxx, maxy = rng.choice(infos).bounds
+        t = tms.tile(rng.uniform(minx, maxx), rng.uniform(miny, maxy), rng.choice(zooms))
+        tile = general_manager.get_tile(collection_name, year, ParametersCOG(t.x, t.y, t.z, tms.bounds(t), with_asv=True, render=render))
+        if tile != None and tile.data[3].any():
+            tiles.append(tile)
+    return tiles
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark tile encoding formats.")
+    parser.add_argument("--data", type=Path, default=Path("./data"))
+    parser.add_argument("--collection", default="pred_ign")
+    parser.add_argument("--year", required=True)
+    parser.add_argument("--zoom", type=int, nargs="+", default=[16, 17, 18])
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--render", choices=["color", "data"], default="color", help="Read the color COG or color the data COG.")
+    args = parser.parse_args()
+
+    general_manager = GeneralManager(args.data)
+    tiles = sample_tiles(general_manager, args.collection, args.year, args.zoom, args.samples, args.seed, args.render)
+    print(f"{len(tiles)} tiles of {args.collection} {args.year} at zoom {args.zoom}")
+
+    palette = ManagerType.get_palette(args.collection)
+    candidates = {
+        "png": lambda tile: encode_tile(tile, "png"),
+        "png palette": lambda tile: encode_tile(tile, "png", palette),
+        "webp": lambda tile: encode_tile(tile, "webp"),
+        "jpg": lambda tile: encode_tile(tile, "jpg"),
+    }
+
+    if len(palette) == 0:
+        # No color.txt, the server encodes png requests as RGBA.
+        del candidates["png palette"]
+
+    print(f"{'format':>12} {'mean ms':>8} {'p95 ms':>8} {'mean KiB':>9}")
+    for name, encode in candidates.items():
+        timings, sizes = [], []
+        for tile in tiles:
+            start = time.perf_counter()
+            data = encode(tile)
+            timings.append((time.perf_counter() - start) * 1000)
+            sizes.append(len(data))
+
+        print(f"{name:>12} {np.mean(timings):>8.2f} {np.percentile(timings, 95):>8.2f} {np.mean(sizes) / 1024:>9.1f}")
+
+    if len(palette) > 0:
+        print(f"png requests of {args.collection} use the palette of its color.txt, {len(palette)} colors.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark of the tile merge: the former per-band np.where loop against the mosaic engine.
+
+Run from the repository root:
+    python -m tools.benchmark.bench_merge
+"""
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+from src.mosaic import MOSAIC_METHODS
+
+
+def legacy_merge(arrays: list[np.ndarray]) -> np.ndarray:
+    """ Merge as BaseManager.get_merge_tiles did before the mosaic engine. """
+    merged_array = arrays[0].copy()
+    for tile_array in arrays[1:]:
+        for i in range(3):
+            merged_array[i, ...] = np.where(merged_array[3, ...] != 0, merged_array[i, ...], tile_array[i, ...])
+        merged_array[3, ...] = np.where(merged_array[3, ...] != 0, merged_array[3, ...], tile_array[3, ...])
+    return merged_array
+
+
+def engine_merge(arrays: list[np.ndarray], method_name: str) -> np.ndarray:
+    method = MOSAIC_METHODS[method_name]()
+    for array in arrays:
+        method.feed(array)
+    return method.result()
+
+
+def make_sources(nb_sources: int, tilesize: int, seed: int = 0) -> list[np.ndarray]:
+    """ RGBA sources, each covering a random band of the tile. """
+    rng = np.random.default_rng(seed)
+    sources = []
+    for _ in range(nb_sources):
+        array = rng.integers(0, 255, (4, tilesize, tilesize), dtype=np.uint8)
+        start = rng.integers(0, tilesize // 2)
+        array[3] = 0
+        array[3, :, start:start + tilesize // 2] = 255
+        sources.append(array)
+    return sources
+
+
+def measure(func, repeat: int) -> tuple[float, int]:
+    """ Return the median time in ms and the peak of memory allocated by numpy during one merge. """
+    timings = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - t) * 1000)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return float(np.median(timings)), peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark tile merge implementations.")
+    parser.add_argument("--sources", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--tilesize", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    tile_bytes = 4 * args.tilesize * args.tilesize
+    # "buffers" is the peak of allocated memory expressed in full RGBA tiles.
+    print(f"{'sources':>8} {'method':>14} {'median ms':>10} {'buffers':>8}")
+    for nb_sources in args.sources:
+        sources = make_sources(nb_sources, args.tilesize)
+
+        candidates = {"legacy": lambda: legacy_merge(sources)}
+        for name in MOSAIC_METHODS:
+            candidates[name] = lambda name=name: engine_merge(sources, name)
+
+        for name, func in candidates.items():
+            median_ms, peak = measure(func, args.repeat)
+            print(f"{nb_sources:>8} {name:>14} {median_ms:>10.3f} {peak / tile_bytes:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Compare server setups under concurrent load: several uvicorn workers encoding in their render threads
+against fewer workers handing the encoding to a process pool (COG_SERVER_ENCODE_PROCESSES).
+
+Each setup is started with the tile cache disabled and receives the same random tiles, every tile is rendered.
+Run from the repository root, with the data folder used by the server:
+    python -m tools.benchmark.bench_render_backend --collection pred_ign --year 2023 --setup 4:0 1:4
+"""
+import os
+import sys
+import time
+import socket
+import random
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import morecantile
+import urllib.request
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from src.base import ParametersCOG
+from src.general import GeneralManager
+
+TMS = morecantile.tms.get("WebMercatorQuad")
+
+
+def list_tiles(general_manager: GeneralManager, collection_name: str, year: str, zooms: list[int], nb_tiles: int, seed: int) -> list[tuple[int, int, int]]:
+    """ Distinct random tiles with at least one source, inside the extent of the collection year. """
+    year_manager = general_manager.get_year_manager(collection_name, year)
+    if year_manager == None:
+        raise SystemExit(f"No data for {collection_name} {year}")
+
+    rng = random.Random(seed)
+    infos = list(year_manager.cog_infos.values())
+
+    tiles, attempts = set(), 0
+    while len(tiles) < nb_tiles and attempts < nb_tiles * 20:
+        attempts += 1
+        minx, miny, maxx, maxy = rng.choice(infos).bounds
+        t = TMS.tile(rng.uniform(minx, maxx), rng.uniform(miny, maxy), rng.choice(zooms))
+        if len(general_manager.get_tile_sources(collection_name, year, None, ParametersCOG(t.x, t.y, t.z, TMS.bounds(t), with_asv=True))) > 0:
+            tiles.add((t.z, t.x, t.y))
+    return sorted(tiles)
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, workers: int, encode_processes: int, cache_path: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        COG_SERVER_ENCODE_PROCESSES=str(encode_processes),
+        COG_SERVER_TILE_CACHE_MEMORY_MB="0",
+        COG_SERVER_TILE_CACHE_DISK="0",
+        COG_SERVER_CACHE_PATH=cache_path,
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(workers), "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+
+    server.terminate()
+    raise SystemExit(f"Server with {workers} workers did not start")
+
+
+def fetch(url: str) -> float:
+    start = time.perf_counter()
+    urllib.request.urlopen(url, timeout=60).read()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_load(base_url: str, tiles: list[tuple[int, int, int]], concurrency: int) -> tuple[float, list[float]]:
+    """ Request every tile with concurrency clients, return the duration in seconds and the latencies in ms. """
+    urls = [f"{base_url}/{z}/{x}/{y}.png" for z, x, y in tiles]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        latencies = list(clients.map(fetch, urls))
+    return time.perf_counter() - start, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the render backends under concurrent load.")
+    parser.add_argument("--data", type=Path, default=Path("./data"))
+    parser.add_argument("--collection", default="pred_ign")
+    parser.add_argument("--year", required=True)
+    parser.add_argument("--zoom", type=int, nargs="+", default=[16, 17, 18])
+    parser.add_argument("--tiles", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--setup", nargs="+", default=["4:0", "1:4"], help="workers:encode_processes of each server setup.")
+    args = parser.parse_args()
+
+    general_manager = GeneralManager(args.data)
+    tiles = list_tiles(general_manager, args.collection, args.year, args.zoom, args.tiles * 2, args.seed)
+    warm_up_tiles, tiles = tiles[::2], tiles[1::2]
+    print(f"{len(tiles)} tiles of {args.collection} {args.year} at zoom {args.zoom}, {args.concurrency} clients")
+
+    print(f"{'workers':>8} {'encoders':>9} {'tiles/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for setup in args.setup:
+        workers, encode_processes = (int(v) for v in setup.split(":"))
+        port = get_free_port()
+
+        with tempfile.TemporaryDirectory() as cache_path:
+            server = start_server(port, workers, encode_processes, cache_path)
+            try:
+                base_url = f"http://127.0.0.1:{port}/{args.collection}/{args.year}"
+                # Index the year and start the encoding processes of every worker.
+                run_load(base_url, warm_up_tiles, args.concurrency)
+                duration, latencies = run_load(base_url, tiles, args.concurrency)
+            finally:
+                server.terminate()
+                server.wait()
+
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"{workers:>8} {encode_processes:>9} {len(tiles) / duration:>8.1f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
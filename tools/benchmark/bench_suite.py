@@ -0,0 +1,333 @@
+"""
+Tile server benchmark on a synthetic data tree: startup time, then pan and zoom traces replayed through
+GeneralManager directly and through the FastAPI app served by uvicorn. Reports throughput, latency
+percentiles, time by stage and memory, and saves them as JSON so two runs can be compared.
+
+Run from the repository root:
+    python -m tools.benchmark.fixtures --out /tmp/bench_data
+    python -m tools.benchmark.bench_suite --data /tmp/bench_data --output before.json
+    python -m tools.benchmark.bench_suite --data /tmp/bench_data --output after.json --env COG_SERVER_READS_PER_TILE=1
+    python -m tools.benchmark.bench_suite --compare before.json after.json
+
+Each measure runs in a new process with its own cache folder, settings are read from the environment
+at import time.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import platform
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import multiprocessing
+import urllib.error
+import urllib.request
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .traces import TMS, build_trace
+
+RESULTS_VERSION = 1
+
+
+def get_rss_mb(pid: int) -> float:
+    """ Resident memory of a process, 0 when it is gone. Linux only. """
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for row in f:
+                if row.startswith("VmRSS:"):
+                    return int(row.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def get_tree_rss_mb(pid: int) -> float:
+    """ Resident memory of a process and its descendants: uvicorn workers, encoding processes. """
+    children: dict[int, list[int]] = {}
+    for stat_path in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat_path.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(stat_path.parent.name))
+
+    total, stack = 0.0, [pid]
+    while len(stack) > 0:
+        current = stack.pop()
+        total += get_rss_mb(current)
+        stack.extend(children.get(current, []))
+    return total
+
+
+def summarize(latencies: list[float], duration: float) -> dict:
+    """ Throughput and latency percentiles in ms of a replayed trace. """
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {
+        "requests": len(latencies),
+        "duration_s": round(duration, 3),
+        "throughput": round(len(latencies) / duration, 2),
+        "mean_ms": round(float(np.mean(latencies)), 2),
+        "p50_ms": round(float(p50), 2),
+        "p90_ms": round(float(p90), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(np.max(latencies)), 2),
+    }
+
+
+def get_server_env(data_path: Path, cache_path: Path, env: dict[str, str]) -> dict[str, str]:
+    """ Settings of a run: the data tree, an empty cache folder, no archive, then the overrides of the command line. """
+    return {
+        "COG_SERVER_DATA_PATH": str(data_path),
+        "COG_SERVER_CACHE_PATH": str(cache_path),
+        "COG_SERVER_ARCHIVE_PATH": str(Path(cache_path, "archives")),
+    } | env
+
+
+def run_isolated(func, *args):
+    """ Run func in a new interpreter, so the settings and the module-level caches start fresh. """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(func, *args).result()
+
+
+def measure_startup(env: dict[str, str]) -> dict:
+    """ Time to import the server modules, create GeneralManager and index every year. """
+    os.environ.update(env)
+
+    start = time.perf_counter()
+    from src.general import GeneralManager
+    imported = time.perf_counter()
+    general_manager = GeneralManager(Path(env["COG_SERVER_DATA_PATH"]))
+    created = time.perf_counter()
+    general_manager.warm_up()
+    ready = time.perf_counter()
+
+    return {
+        "import_s": round(imported - start, 3),
+        "init_s": round(created - imported, 3),
+        "warm_up_s": round(ready - created, 3),
+        "rss_mb": round(get_rss_mb(os.getpid()), 1),
+    }
+
+
+def run_direct(env: dict[str, str], trace: list[dict], concurrency: int, tile_cache_mb: int) -> dict:
+    """ Replay the trace on TileRenderer from a pool of threads, as the render executor of a worker does. """
+    os.environ.update(env)
+
+    from src.base import ParametersCOG, reader_cache
+    from src.general import GeneralManager
+    from src.render import TileRenderer
+    from src.tile_cache import TileCache
+
+    data_path = Path(env["COG_SERVER_DATA_PATH"])
+    general_manager = GeneralManager(data_path)
+    general_manager.warm_up()
+    tile_cache = TileCache(Path(env["COG_SERVER_CACHE_PATH"]), tile_cache_mb, False) if tile_cache_mb > 0 else None
+    renderer = TileRenderer(general_manager, data_path, tile_cache)
+
+    def render(request: dict) -> tuple[float, dict[str, float], bool]:
+        specie = request["specie"]
+        params = ParametersCOG(request["x"], request["y"], request["z"], TMS.bounds(request["x"], request["y"], request["z"]), with_asv=specie == None)
+
+        start = time.perf_counter()
+        outside = general_manager.is_outside(request["collection"], request["year"], specie, params)
+        if not outside:
+            if specie == None:
+                renderer.render_tile(request["collection"], request["year"], params)
+            else:
+                renderer.render_specie_tile(request["collection"], request["year"], specie, params)
+        return (time.perf_counter() - start) * 1000, params.stats.timings, outside
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        results = list(threads.map(render, trace))
+    duration = time.perf_counter() - start
+
+    stages: dict[str, float] = {}
+    for _, timings, _ in results:
+        for name, value in timings.items():
+            stages[name] = stages.get(name, 0.0) + value
+
+    readers = reader_cache.stats()
+    return summarize([r[0] for r in results], duration) | {
+        "outside": sum(1 for r in results if r[2]),
+        "stages_mean_ms": {name: round(value / len(results), 3) for name, value in stages.items()},
+        "reader_misses": sum(c["misses"] for c in readers["collections"].values()),
+        "tile_cache": tile_cache.stats() if tile_cache != None else None,
+        "rss_mb": round(get_rss_mb(os.getpid()), 1),
+    }
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def fetch(url: str) -> tuple[float, int]:
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return (time.perf_counter() - start) * 1000, status
+
+
+def run_app(env: dict[str, str], trace: list[dict], concurrency: int, workers: int) -> dict:
+    """ Start uvicorn, wait until every year is indexed, then replay the trace over HTTP. """
+    port = get_free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(workers), "--port", str(port), "--log-level", "warning"],
+        env=dict(os.environ) | env | {"COG_SERVER_WARMUP": "1"},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        start = time.perf_counter()
+        alive_s, ready_s = None, None
+        while ready_s == None and time.perf_counter() - start < 300:
+            try:
+                with urllib.request.urlopen(f"{base_url}/health", timeout=5) as response:
+                    health = json.load(response)
+                alive_s = alive_s or time.perf_counter() - start
+                if health["indexed"]:
+                    ready_s = time.perf_counter() - start
+            except OSError:
+                pass
+            time.sleep(0.05)
+        if ready_s == None:
+            raise RuntimeError("The server did not get ready")
+
+        rss_ready = get_tree_rss_mb(server.pid)
+        urls = [f"{base_url}/{r['layer']}/{r['z']}/{r['x']}/{r['y']}.png" for r in trace]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as clients:
+            results = list(clients.map(fetch, urls))
+        duration = time.perf_counter() - start
+
+        statuses: dict[str, int] = {}
+        for _, status in results:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        return summarize([r[0] for r in results], duration) | {
+            "workers": workers,
+            "statuses": statuses,
+            "startup_alive_s": round(alive_s, 3),
+            "startup_ready_s": round(ready_s, 3),
+            "rss_ready_mb": round(rss_ready, 1),
+            "rss_mb": round(get_tree_rss_mb(server.pid), 1),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def get_git_revision() -> str | None:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip() != ""
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{revision}-dirty" if dirty else revision
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    """ Numeric values of a results file by dotted path. """
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[f"{prefix}{key}"] = value
+    return values
+
+
+def compare(before_path: Path, after_path: Path) -> None:
+    with open(before_path, "r") as f:
+        before = json.load(f)
+    with open(after_path, "r") as f:
+        after = json.load(f)
+
+    print(f"before: {before['meta']['git']} {before['meta']['date']}")
+    print(f"after:  {after['meta']['git']} {after['meta']['date']}")
+    before_values, after_values = flatten(before["results"]), flatten(after["results"])
+
+    print(f"{'metric':<36} {'before':>10} {'after':>10} {'change':>8}")
+    for name in sorted(set(before_values) | set(after_values)):
+        a, b = before_values.get(name), after_values.get(name)
+        change = "" if a in (None, 0) or b == None else f"{(b - a) / a * 100:+.1f}%"
+        print(f"{name:<36} {'-' if a == None else a:>10} {'-' if b == None else b:>10} {change:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the tile server on a synthetic data tree.")
+    parser.add_argument("--data", type=Path, help="Tree generated by tools.benchmark.fixtures.")
+    parser.add_argument("--output", type=Path, help="JSON file the results are written to.")
+    parser.add_argument("--mode", nargs="+", choices=["startup", "direct", "app"], default=["startup", "direct", "app"])
+    parser.add_argument("--sessions", type=int, default=20, help="Map sessions in the trace.")
+    parser.add_argument("--steps", type=int, default=8, help="Pans or zooms by session.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=8, help="Tiles rendered or requested at the same time.")
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn workers of the app mode.")
+    parser.add_argument("--tile-cache-mb", type=int, default=0, help="Memory tile cache of the direct mode, 0 renders every request.")
+    parser.add_argument("--env", nargs="*", default=[], help="Settings of the runs, as COG_SERVER_NAME=value.")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two results files and exit.")
+    args = parser.parse_args()
+
+    if args.compare != None:
+        compare(*args.compare)
+        return
+    if args.data == None:
+        parser.error("--data is required")
+
+    with open(Path(args.data, "benchmark.json"), "r") as f:
+        fixture = json.load(f)
+    data_path = args.data.resolve()
+    env = dict(item.split("=", 1) for item in args.env)
+    trace = build_trace(fixture["layers"], args.sessions, args.steps, args.seed)
+    print(f"{len(trace)} requests in {args.sessions} sessions on {len(fixture['layers'])} layers")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        if "startup" in args.mode:
+            # Cold: every COG is opened to build the index. Warm: the index manifests of the first run are reused.
+            cache_path = Path(tmp, "startup")
+            results["startup_cold"] = run_isolated(measure_startup, get_server_env(data_path, cache_path, env))
+            results["startup_warm"] = run_isolated(measure_startup, get_server_env(data_path, cache_path, env))
+            print(f"startup: {results['startup_cold']} cold, {results['startup_warm']} warm")
+
+        if "direct" in args.mode:
+            results["direct"] = run_isolated(run_direct, get_server_env(data_path, Path(tmp, "direct"), env), trace, args.concurrency, args.tile_cache_mb)
+            print(f"direct: {results['direct']}")
+
+        if "app" in args.mode:
+            results["app"] = run_app(get_server_env(data_path, Path(tmp, "app"), env), trace, args.concurrency, args.workers)
+            print(f"app: {results['app']}")
+
+    output = {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "git": get_git_revision(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "fixture": fixture["parameters"],
+            "arguments": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        },
+        "results": results,
+    }
+    if args.output != None:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Generate a synthetic data tree for benchmarks, laid out and named like the real one.
+
+Each year of each collection is a grid of overlapping survey strips over a lagoon: bathy color/depth pairs,
+ortho ASV and UAV strips, IGN ortho, IGN and drone habitat maps with their data COG and ASV predictions of
+a few species. Color COGs are colored with the ramps of tools/*/color.txt. The layers and their zoom range
+are listed in benchmark.json at the root of the tree.
+
+Run from the repository root:
+    python -m tools.benchmark.fixtures --out /tmp/bench_data --years 2 --surveys 9 --size 1024
+"""
+import json
+import math
+import shutil
+import argparse
+import numpy as np
+import morecantile
+from PIL import Image
+from pathlib import Path
+
+import rasterio
+import rasterio.shutil
+from rasterio.io import MemoryFile
+from rasterio.enums import ColorInterp
+from rasterio.transform import from_origin
+
+from src.colormap import load_colormap
+
+FIXTURE_VERSION = 1
+TMS = morecantile.tms.get("WebMercatorQuad")
+
+# North west corner of the surveys, a lagoon of La Réunion.
+ORIGIN = (55.22, -21.08)
+# Pixel size of the surveys in degrees, about 0.5 m.
+RESOLUTION = 0.000005
+SITES = ["REU-ERMITAGE", "REU-SALINE", "REU-TROU-DEAU", "REU-ETANG-SALE"]
+
+
+def smooth_field(rng: np.random.Generator, size: int, cells: int) -> np.ndarray:
+    """ Random field in [0, 1] varying over about size / cells pixels, compresses like real imagery. """
+    coarse = Image.fromarray(rng.random((cells, cells), dtype=np.float32))
+    return np.asarray(coarse.resize((size, size), Image.BICUBIC)).clip(0, 1)
+
+
+def strip_mask(rng: np.random.Generator, size: int) -> np.ndarray:
+    """ Valid pixels of a survey: a wavy diagonal strip with a few holes, nodata around it like a real track. """
+    yy, xx = np.mgrid[0:size, 0:size] / size
+    offset = 0.15 * smooth_field(rng, size, 4) - 0.075
+    band = np.abs(yy - xx - offset) < 0.35
+    return band & (smooth_field(rng, size, 8) > 0.1)
+
+
+def write_cog(path: Path, array: np.ndarray, left: float, top: float, nodata: float | None = None, rgba: bool = False) -> None:
+    """ Write a web optimized COG, as rio cogeo create --web-optimized does in the processing scripts. """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profile = dict(
+        driver="GTiff", width=array.shape[2], height=array.shape[1], count=array.shape[0], dtype=array.dtype,
+        crs="EPSG:4326", transform=from_origin(left, top, RESOLUTION, RESOLUTION), nodata=nodata,
+    )
+    options = dict(COMPRESS="WEBP", QUALITY=90) if rgba else dict(COMPRESS="DEFLATE")
+
+    with MemoryFile() as memfile:
+        with memfile.open(**profile) as dst:
+            dst.write(array)
+            if rgba:
+                dst.colorinterp = [ColorInterp.red, ColorInterp.green, ColorInterp.blue, ColorInterp.alpha]
+        with memfile.open() as src:
+            rasterio.shutil.copy(src, path, driver="COG", TILING_SCHEME="GoogleMapsCompatible", RESAMPLING="nearest" if not rgba else "bilinear", **options)
+
+
+def get_zoom_range() -> tuple[int, int]:
+    """ Zoom levels the surveys are worth looking at, from their resolution. """
+    res = RESOLUTION * 2 * math.pi * 6378137 / 360
+    maxzoom = TMS.zoom_for_res(res)
+    return max(maxzoom - 7, 0), maxzoom
+
+
+class FixtureBuilder:
+
+    def __init__(self, out: Path, size: int, surveys: int, seed: int) -> None:
+        self.out = out
+        self.size = size
+        self.surveys = surveys
+        self.rng = np.random.default_rng(seed)
+        self.layers: list[dict] = []
+
+
+    def get_survey_origins(self, year_index: int) -> list[tuple[float, float]]:
+        """ Top left corner of each strip: a grid with 30 % overlap, shifted by year. """
+        span = self.size * RESOLUTION
+        columns = math.ceil(math.sqrt(self.surveys))
+        origins = []
+        for i in range(self.surveys):
+            column, row = i % columns, i // columns
+            left = ORIGIN[0] + column * span * 0.7 + year_index * span * 0.2
+            top = ORIGIN[1] - row * span * 0.7 + (column % 2) * span * 0.1 - year_index * span * 0.1
+            origins.append((left, top))
+        return origins
+
+
+    def add_layer(self, collection_name: str, year: str, specie: str | None, origins: list[tuple[float, float]]) -> None:
+        span = self.size * RESOLUTION
+        minzoom, maxzoom = get_zoom_range()
+        self.layers.append({
+            "collection": collection_name,
+            "year": year,
+            "specie": specie,
+            "bounds": [min(o[0] for o in origins), min(o[1] for o in origins) - span, max(o[0] for o in origins) + span, max(o[1] for o in origins)],
+            "minzoom": minzoom,
+            "maxzoom": maxzoom,
+        })
+
+
+    def make_ortho(self, mask: np.ndarray) -> np.ndarray:
+        """ RGBA imagery: sand, seagrass and coral patches. """
+        rgba = np.zeros((4, self.size, self.size), dtype=np.uint8)
+        base = smooth_field(self.rng, self.size, 16)
+        detail = smooth_field(self.rng, self.size, 96)
+        for band, (low, high) in enumerate([(40, 210), (90, 220), (110, 200)]):
+            rgba[band] = low + (high - low) * (0.7 * base + 0.3 * detail)
+        rgba[3] = 255
+        rgba[:, ~mask] = 0
+        return rgba
+
+
+    def build_bathy(self, year: str, origins: list[tuple[float, float]]) -> None:
+        colormap = load_colormap(Path("tools/bathy/color.txt"), False)
+        for i, (left, top) in enumerate(origins):
+            mask = strip_mask(self.rng, self.size)
+            depth = (-1 - 25 * smooth_field(self.rng, self.size, 6)).astype(np.float32)
+            depth[~mask] = np.nan
+
+            name = f"{year}0{i % 9 + 1}15_{SITES[i % len(SITES)]}_ASV-1_{i:02d}"
+            write_cog(Path(self.out, "bathy", year, f"{name}_depth_cog.tif"), depth[None], left, top, nodata=np.nan)
+            write_cog(Path(self.out, "bathy", year, f"{name}_color_cog.tif"), colormap.apply(depth, mask), left, top, rgba=True)
+        self.add_layer("bathy", year, None, origins)
+
+
+    def build_ortho(self, year: str, origins: list[tuple[float, float]]) -> None:
+        """ ASV and UAV strips alternate, each overlaps its neighbours of the other platform. """
+        for i, (left, top) in enumerate(origins):
+            platform = "ASV-1" if i % 2 == 0 else "UAV-01"
+            name = f"{year}0{i % 9 + 1}15_{SITES[i % len(SITES)]}_{platform}_{i:02d}_ortho_cog.tif"
+            write_cog(Path(self.out, "ortho", year, name), self.make_ortho(strip_mask(self.rng, self.size)), left, top, rgba=True)
+        self.add_layer("ortho", year, None, origins)
+
+
+    def build_ign(self, year: str, origins: list[tuple[float, float]]) -> None:
+        """ IGN ortho covers its whole footprint. """
+        full = np.ones((self.size, self.size), dtype=bool)
+        for i, (left, top) in enumerate(origins):
+            write_cog(Path(self.out, "ign", year, f"{year}_IGN_BDORTHO_{i:02d}_cog.tif"), self.make_ortho(full), left, top, rgba=True)
+        self.add_layer("ign", year, None, origins)
+
+
+    def build_habitat(self, collection_name: str, year: str, origins: list[tuple[float, float]]) -> None:
+        """ Class map in a preddata COG and its colored COG, classes from tools/<collection>/color.txt. """
+        colormap = load_colormap(Path("tools", collection_name, "color.txt"), True)
+        classes = np.array([int(value) for value, _ in colormap.entries if value > 0], dtype=np.uint8)
+
+        for i, (left, top) in enumerate(origins):
+            mask = strip_mask(self.rng, self.size)
+            field = smooth_field(self.rng, self.size, 24)
+            pred = classes[np.minimum((field * len(classes)).astype(int), len(classes) - 1)]
+            pred[~mask] = 0
+
+            name = f"{year}_{SITES[i % len(SITES)]}_{i:02d}"
+            write_cog(Path(self.out, collection_name, year, f"{name}_preddata_cog.tif"), pred[None], left, top, nodata=0)
+            write_cog(Path(self.out, collection_name, year, f"{name}_color_cog.tif"), colormap.apply(pred, mask), left, top, rgba=True)
+        self.add_layer(collection_name, year, None, origins)
+
+
+    def build_pred_asv(self, year: str, origins: list[tuple[float, float]], species: dict[str, list[int]]) -> None:
+        """ Probability of each specie colored from white to its color, transparent below 0.5, as 0.format_session_doi does. """
+        for specie, color in species.items():
+            for i, (left, top) in enumerate(origins):
+                probability = smooth_field(self.rng, self.size, 12)
+                mask = strip_mask(self.rng, self.size) & (probability >= 0.5)
+
+                rgba = np.zeros((4, self.size, self.size), dtype=np.uint8)
+                for band in range(3):
+                    rgba[band] = 255 * (1 - probability) + color[band] * probability
+                rgba[3] = 255
+                rgba[:, ~mask] = 0
+
+                write_cog(Path(self.out, "pred_asv", year, f"group_{year}_{specie}_{i}_colored_cog.tif"), rgba, left, top, rgba=True)
+            self.add_layer("pred_asv", year, specie, origins)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic COG data tree for benchmarks.")
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--surveys", type=int, default=9, help="Survey strips by collection year.")
+    parser.add_argument("--size", type=int, default=1024, help="Width and height of a survey, in pixels.")
+    parser.add_argument("--species", type=int, default=3, help="Species of the ASV predictions.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.out.exists():
+        shutil.rmtree(args.out)
+    args.out.mkdir(parents=True)
+
+    Image.new("RGBA", (256, 256), (0, 0, 0, 0)).save(Path(args.out, "transparent.png"))
+
+    with open("tools/pred_asv/color_asv_pred_by_specie.json", "r") as f:
+        colors = json.load(f)
+    # Species names end up in file names.
+    names = sorted(name for name in colors if "/" not in name)
+    species = {name: colors[name] for name in names[::max(len(names) // args.species, 1)][:args.species]}
+    Path(args.out, "pred_asv").mkdir()
+    with open(Path(args.out, "pred_asv", "color_asv_pred_by_specie.json"), "w") as f:
+        json.dump(species, f, indent=4)
+
+    builder = FixtureBuilder(args.out, args.size, args.surveys, args.seed)
+    for year_index in range(args.years):
+        year = str(2021 + year_index)
+        origins = builder.get_survey_origins(year_index)
+        builder.build_bathy(year, origins)
+        builder.build_ortho(year, origins)
+        builder.build_ign(year, origins)
+        builder.build_habitat("pred_ign", year, origins)
+        builder.build_habitat("pred_drone", year, origins)
+        builder.build_pred_asv(year, origins, species)
+        print(f"Year {year} written")
+
+    with open(Path(args.out, "benchmark.json"), "w") as f:
+        json.dump({"version": FIXTURE_VERSION, "parameters": vars(args) | {"out": str(args.out)}, "layers": builder.layers}, f, indent=2)
+    print(f"{len(builder.layers)} layers written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
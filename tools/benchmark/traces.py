@@ -0,0 +1,68 @@
+"""
+Tile request traces of map sessions: a user opens a layer, pans and zooms, the client loads the tiles of the
+viewport nearest to its center first, like Leaflet and MapLibre do.
+"""
+import random
+import morecantile
+
+TMS = morecantile.tms.get("WebMercatorQuad")
+
+
+def get_layer_path(layer: dict) -> str:
+    """ URL path of a layer of benchmark.json, without the tile coordinates. """
+    if layer["specie"] == None:
+        return f"{layer['collection']}/{layer['year']}"
+    return f"{layer['collection']}/{layer['year']}/{layer['specie']}"
+
+
+def get_viewport(z: int, center_x: float, center_y: float, width: int, height: int) -> list[tuple[int, int, int]]:
+    """ Tiles of a viewport of width x height tiles around a center in tile units, nearest to the center first. """
+    max_index = (1 << z) - 1
+    tiles = []
+    for x in range(int(center_x - width / 2), int(center_x + width / 2) + 1):
+        for y in range(int(center_y - height / 2), int(center_y + height / 2) + 1):
+            if 0 <= x <= max_index and 0 <= y <= max_index:
+                tiles.append((z, x, y))
+    return sorted(tiles, key=lambda t: (t[1] + 0.5 - center_x) ** 2 + (t[2] + 0.5 - center_y) ** 2)
+
+
+def build_session(rng: random.Random, layer: dict, steps: int, width: int, height: int) -> list[tuple[int, int, int]]:
+    """ Tiles requested by one session on a layer: start somewhere on the surveys, then pan or zoom at each step. """
+    minx, miny, maxx, maxy = layer["bounds"]
+    # From the native resolution of the surveys to 3 levels above, plus one level of overzoom.
+    min_z, max_z = max(layer["minzoom"], layer["maxzoom"] - 3), layer["maxzoom"] + 1
+    z = rng.randint(min_z, max_z - 1)
+    tile = TMS.tile(rng.uniform(minx, maxx), rng.uniform(miny, maxy), z)
+    center_x, center_y = tile.x + 0.5, tile.y + 0.5
+
+    requested = []
+    for _ in range(steps):
+        requested.extend(get_viewport(z, center_x, center_y, width, height))
+
+        action = rng.random()
+        if action < 0.6:
+            # Pan by up to half the viewport.
+            center_x += rng.uniform(-width / 2, width / 2)
+            center_y += rng.uniform(-height / 2, height / 2)
+        elif action < 0.8 and z < max_z:
+            z, center_x, center_y = z + 1, center_x * 2, center_y * 2
+        elif z > min_z:
+            z, center_x, center_y = z - 1, center_x / 2, center_y / 2
+
+        # Users look at the surveys: the center stays over the layer.
+        top_left, bottom_right = TMS.tile(minx, maxy, z), TMS.tile(maxx, miny, z)
+        center_x = min(max(center_x, top_left.x), bottom_right.x + 1)
+        center_y = min(max(center_y, top_left.y), bottom_right.y + 1)
+
+    return requested
+
+
+def build_trace(layers: list[dict], sessions: int, steps: int, seed: int, width: int = 5, height: int = 4) -> list[dict]:
+    """ Requests of several sessions on random layers, in the order the clients send them. """
+    rng = random.Random(seed)
+    trace = []
+    for _ in range(sessions):
+        layer = rng.choice(layers)
+        for z, x, y in build_session(rng, layer, steps, width, height):
+            trace.append({"layer": get_layer_path(layer), "collection": layer["collection"], "year": layer["year"], "specie": layer["specie"], "z": z, "x": x, "y": y})
+    return trace
@@ -0,0 +1,49 @@
+"""
+Build or update the pre-merged overviews used for tiles below COG_SERVER_OVERVIEW_ZOOM.
+
+The server builds them in the background on the first low zoom request, this command does it ahead of time.
+Only tiles whose source COG changed since the previous build are rendered again.
+
+Run from the repository root:
+    COG_SERVER_OVERVIEW_ZOOM=12 python -m tools.tiles.build_overviews --collection ortho
+"""
+import time
+import argparse
+from pathlib import Path
+
+from src import settings
+from src.general import GeneralManager, ManagerType
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the low zoom overviews of the collection years.")
+    parser.add_argument("--data", type=Path, default=Path("./data"))
+    parser.add_argument("--collection", default=None, help="Every collection when omitted.")
+    parser.add_argument("--year", default=None, help="Every year when omitted.")
+    args = parser.parse_args()
+
+    if settings.OVERVIEW_ZOOM <= 0:
+        raise SystemExit("Set COG_SERVER_OVERVIEW_ZOOM to the zoom level served from the COG.")
+
+    general_manager = GeneralManager(args.data)
+    for collection_name, registry in general_manager.get_registries().items():
+        if args.collection != None and collection_name != args.collection: continue
+
+        for year in registry:
+            if args.year != None and year != args.year: continue
+
+            year_manager = registry.get(year, None)
+            if year_manager == None: continue
+
+            year_managers = [year_manager]
+            if collection_name == ManagerType.PRED_ASV.value:
+                year_managers = [m for m in (year_manager.pred_cog_by_specie.get(s, None) for s in year_manager.pred_cog_by_specie) if m != None]
+
+            for manager in year_managers:
+                start = time.perf_counter()
+                stats = manager.build_overview()
+                print(f"{manager.overview_key}: {stats or 'built by another process'} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
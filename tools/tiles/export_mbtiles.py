@@ -0,0 +1,96 @@
+"""
+Build the MBTiles archive of a frozen collection year from its COG.
+
+The server answers the tiles of the archive zoom range from it without reading any COG. The archive
+is written next to the final file and moved in place at the end, restart the server to serve it.
+
+Run from the repository root:
+    python -m tools.tiles.export_mbtiles --collection ortho --year 2023 --zoom 10 20 --format webp
+"""
+import os
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from src import settings
+from src.general import GeneralManager, ManagerType
+from src.archive import ArchiveStore
+from tools.tiles.seed import init_worker, render_worker, list_tiles
+
+
+def create_archive(path: Path, metadata: dict[str, str]) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+    conn.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+    conn.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+    conn.executemany("INSERT INTO metadata (name, value) VALUES (?, ?)", metadata.items())
+    return conn
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export a collection year to an MBTiles archive.")
+    parser.add_argument("--data", type=Path, default=Path("./data"))
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--year", required=True)
+    parser.add_argument("--specie", default=None, help="Specie, for pred_asv only.")
+    parser.add_argument("--zoom", type=int, nargs=2, default=[10, 20], metavar=("MIN", "MAX"))
+    parser.add_argument("--format", choices=["png", "webp", "jpg"], default="png", help="Format of the tiles, the server only uses the archive for requests in this format.")
+    parser.add_argument("--no-asv", action="store_true", help="Export the ortho tiles without ASV surveys.")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    general_manager = GeneralManager(args.data)
+    with_asv = not args.no_asv
+    zooms = list(range(args.zoom[0], args.zoom[1] + 1))
+    tiles = list_tiles(general_manager, args.collection, args.year, args.specie, zooms)
+
+    cog_bounds = [info.bounds for info in general_manager.get_year_manager(args.collection, args.year, args.specie).cog_infos.values()]
+    bounds = (min(b[0] for b in cog_bounds), min(b[1] for b in cog_bounds), max(b[2] for b in cog_bounds), max(b[3] for b in cog_bounds))
+    name = ArchiveStore.get_name(args.year, args.specie)
+    metadata = {
+        "name": f"{args.collection} {name}",
+        "description": ManagerType.get_description(args.collection),
+        "attribution": ManagerType.get_attribution(args.collection),
+        "type": "overlay",
+        "version": "1",
+        "format": args.format,
+        "bounds": ",".join(str(v) for v in bounds),
+        "center": f"{(bounds[0] + bounds[2]) / 2},{(bounds[1] + bounds[3]) / 2},{args.zoom[0]}",
+        "minzoom": str(args.zoom[0]),
+        "maxzoom": str(args.zoom[1]),
+        "with_asv": "1" if with_asv else "0",
+    }
+
+    archive_path = Path(settings.ARCHIVE_PATH, args.collection, f"{name}.mbtiles")
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = archive_path.with_suffix(".mbtiles.tmp")
+    tmp_path.unlink(missing_ok=True)
+    conn = create_archive(tmp_path, metadata)
+
+    jobs = [(args.collection, args.year, args.specie, t.z, t.x, t.y, with_asv, args.format, (t.z, t.x, t.y), None) for t in tiles]
+    print(f"{len(jobs)} tiles to render into {archive_path}")
+
+    start, written = time.perf_counter(), 0
+    with ProcessPoolExecutor(max_workers=args.processes, initializer=init_worker, initargs=(args.data,)) as pool:
+        for i, result in enumerate(pool.map(render_worker, jobs, chunksize=16), start=1):
+            if result != None:
+                (z, x, y), _, tile_data = result
+                conn.execute("INSERT INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)", (z, x, (1 << z) - 1 - y, tile_data))
+                written += 1
+            if i % 1000 == 0:
+                print(f"{i}/{len(jobs)} tiles, {i / (time.perf_counter() - start):.1f} tiles/s", flush=True)
+
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp_path, archive_path)
+
+    print(f"Done in {time.perf_counter() - start:.1f}s: {written} tiles written, {archive_path.stat().st_size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
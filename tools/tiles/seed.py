@@ -0,0 +1,125 @@
+"""
+Render the tiles of a collection year ahead of time into the tile cache shared by the server workers.
+
+The walk covers the extent of every COG of the year in the spatial index. Tiles already seeded with
+the same source COG (name, mtime, size) are skipped, so an interrupted run resumes where it stopped
+and a new run only renders tiles whose sources changed.
+
+Run from the repository root:
+    python -m tools.tiles.seed --collection ortho --year 2023 --zoom 10 14 --processes 8
+"""
+import time
+import argparse
+import morecantile
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from src import settings
+from src.base import ParametersCOG, signature_fingerprint
+from src.general import GeneralManager
+from src.render import TileRenderer
+from src.tile_cache import DiskTileCache, TileCache
+
+TMS = morecantile.tms.get("WebMercatorQuad")
+
+# Set in each process of the pool.
+renderer: TileRenderer | None = None
+
+
+def init_worker(data_path: Path) -> None:
+    global renderer
+    renderer = TileRenderer(GeneralManager(data_path), data_path)
+
+
+def render_worker(job: tuple) -> tuple[str, str, bytes] | None:
+    """ Render one tile, None when it has no data. """
+    collection_name, year, specie, z, x, y, with_asv, img_format, key, fingerprint = job
+    params = ParametersCOG(x, y, z, TMS.bounds(x, y, z), with_asv=with_asv, img_format=img_format)
+
+    if specie == None:
+        tile = renderer.general_manager.get_tile(collection_name, year, params)
+    else:
+        tile = renderer.general_manager.get_tile_with_species(collection_name, year, specie, params)
+
+    if tile == None:
+        return None
+
+    return key, fingerprint, renderer.encode(collection_name, tile, params)
+
+
+def list_tiles(general_manager: GeneralManager, collection_name: str, year: str, specie: str | None, zooms: list[int]) -> list[morecantile.Tile]:
+    """ Every tile of the zoom levels touching a COG of the year. """
+    year_manager = general_manager.get_year_manager(collection_name, year, specie)
+    if year_manager == None:
+        raise SystemExit(f"No data for {collection_name} {year} {specie or ''}")
+
+    tiles = set()
+    for info in year_manager.cog_infos.values():
+        tiles.update(TMS.tiles(*info.bounds, zooms=zooms))
+
+    return sorted(tiles, key=lambda t: (t.z, t.x, t.y))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed the tile cache of a collection year.")
+    parser.add_argument("--data", type=Path, default=Path("./data"))
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--year", required=True)
+    parser.add_argument("--specie", default=None, help="Specie, for pred_asv only.")
+    parser.add_argument("--zoom", type=int, nargs=2, default=[10, 14], metavar=("MIN", "MAX"))
+    parser.add_argument("--format", choices=["png", "webp", "jpg"], default="png")
+    parser.add_argument("--no-asv", action="store_true", help="Seed the ortho tiles without ASV surveys.")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--batch", type=int, default=256, help="Tiles written to the cache by transaction.")
+    args = parser.parse_args()
+
+    general_manager = GeneralManager(args.data)
+    disk_cache = DiskTileCache(Path(settings.CACHE_PATH, "tiles.sqlite"), settings.TILE_CACHE_DISK_MB * 1024 * 1024)
+    with_asv = not args.no_asv
+
+    tiles = list_tiles(general_manager, args.collection, args.year, args.specie, list(range(args.zoom[0], args.zoom[1] + 1)))
+
+    # Tiles of a previous version of the year would be dropped by the server after seeding.
+    year_manager = general_manager.get_loaded_year(args.collection, args.year)
+    if year_manager != None:
+        disk_cache.sync_year(f"{args.collection}/{args.year}/", signature_fingerprint(year_manager.folder_signature))
+
+    jobs, up_to_date = [], 0
+    for t in tiles:
+        params = ParametersCOG(t.x, t.y, t.z, TMS.bounds(t), with_asv=with_asv)
+        sources = general_manager.get_tile_sources(args.collection, args.year, args.specie, params)
+        if len(sources) == 0:
+            continue
+
+        key = TileCache.build_key(args.collection, args.year, args.specie, t.z, t.x, t.y, with_asv, "color", args.format)
+        fingerprint = general_manager.get_source_fingerprint(args.collection, args.year, args.specie, sources)
+        if disk_cache.has(key, fingerprint):
+            up_to_date += 1
+            continue
+
+        jobs.append((args.collection, args.year, args.specie, t.z, t.x, t.y, with_asv, args.format, key, fingerprint))
+
+    print(f"{len(tiles)} tiles in the extent, {up_to_date} up to date, {len(jobs)} to render")
+
+    start, rendered, empty, rows = time.perf_counter(), 0, 0, []
+    with ProcessPoolExecutor(max_workers=args.processes, initializer=init_worker, initargs=(args.data,)) as pool:
+        for result in pool.map(render_worker, jobs, chunksize=16):
+            if result == None:
+                empty += 1
+                continue
+
+            rows.append(result)
+            rendered += 1
+            if len(rows) >= args.batch:
+                disk_cache.put_many(rows)
+                rows = []
+                print(f"{rendered + empty}/{len(jobs)} tiles, {(rendered + empty) / (time.perf_counter() - start):.1f} tiles/s", flush=True)
+
+    if len(rows) > 0:
+        disk_cache.put_many(rows)
+
+    print(f"Done in {time.perf_counter() - start:.1f}s: {rendered} tiles written, {empty} empty")
+
+
+if __name__ == "__main__":
+    main()